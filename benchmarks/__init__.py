@@ -0,0 +1,17 @@
+import os
+
+# Importing the jobs wires the application container and the database engine, which require these settings.
+# Benchmarks never reach Azure, so placeholders are enough unless the caller provides real values.
+for _name, _value in {
+    "COSMOS_ACCOUNT_CONNECTION_STRING": "AccountEndpoint=https://localhost:8081/;AccountKey=a2V5;",
+    "STORAGE_ACCOUNT_NAME": "benchmarks",
+    "STORAGE_ACCOUNT_KEY": "a2V5",
+    "JOBS_TABLE_NAME": "jobs",
+    "SQL_ENGINE": "postgres",
+    "SQL_HOST": "localhost",
+    "SQL_PORT": "5432",
+    "SQL_DATABASE": "benchmarks",
+    "SQL_USER": "benchmarks",
+    "SQL_PASSWORD": "benchmarks",
+}.items():
+    os.environ.setdefault(_name, _value)
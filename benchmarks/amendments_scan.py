@@ -0,0 +1,59 @@
+"""
+Time of the amendments read and filter stages when every member is decoded before drop_data, against the raw bytes
+scan that drops the amendments sorted before the last run without decoding them. Run on a synthetic export where
+`--changed-fraction` of the amendments were sorted since the last run, like an archive read without its manifest.
+
+    python -m benchmarks.amendments_scan [--amendments 20000] [--changed-fraction 0.05] [--workers 8]
+"""
+import argparse
+import datetime
+import importlib
+import os
+import tempfile
+import time
+from functools import partial
+
+from shared.utils import ZipSource, read_json_member, wrap_around_executor_progress_bar
+from .generator import write_amendments_archive
+
+# The job module, as the package attribute is the job function
+function = importlib.import_module("shared.functions.amendments.function")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--amendments", type=int, default=20000)
+    parser.add_argument("--changed-fraction", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_amendments_archive(os.path.join(directory, "amendments.zip"), args.amendments,
+                                        changed_fraction=args.changed_fraction, revision=1)
+        last_run = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=1)
+        names = ZipSource(path).names
+
+        def decode_all():
+            read = partial(read_json_member, path, drop_keys=function.USELESS_DATA)
+            data = wrap_around_executor_progress_bar(read, names, "Reading", workers=args.workers)
+            return function.drop_data(data, last_run)
+
+        def scan_first():
+            read = partial(function.read_if_sorted_after, path, last_run)
+            data = wrap_around_executor_progress_bar(read, names, "Reading", workers=args.workers)
+            return function.drop_data([d for d in data if d is not None], last_run)
+
+        print(f"Reading and filtering {len(names)} amendments with {args.workers} workers:")
+        timings, kept = [], []
+        for description, operation in [("decode all, then drop_data", decode_all),
+                                       ("scan dateSort, then decode", scan_first)]:
+            start = time.perf_counter()
+            kept.append(operation())
+            timings.append(time.perf_counter() - start)
+            print(f"  {description:<35} {timings[-1]:.3f}s, {len(kept[-1])} kept")
+        assert kept[0] == kept[1], "The scan must keep the same amendments as the full decode"
+        print(f"  speed-up: x{timings[0] / timings[1]:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Timings of the cached date parsing layer against the dateutil / strptime / fromisoformat calls it replaces.
+
+    python -m benchmarks.date_parsing [--samples 50000] [--distinct 5000]
+"""
+import argparse
+import datetime
+import random
+import time
+from typing import Callable, List, Tuple
+
+from dateutil import parser as dateutil_parser
+
+from shared.utils import date_utils
+
+
+def samples(count: int, distinct: int) -> Tuple[List[str], List[str]]:
+    random.seed(42)
+    start = datetime.datetime(2017, 6, 21, tzinfo=datetime.timezone(datetime.timedelta(hours=1)))
+    moments = [start + datetime.timedelta(minutes=random.randint(0, 60 * 24 * 365 * 6)) for _ in range(distinct)]
+    timestamps = [m.isoformat(timespec="milliseconds") for m in moments]
+    dates = [m.strftime(date_utils.DATE_FORMAT) for m in moments]
+    return [random.choice(timestamps) for _ in range(count)], [random.choice(dates) for _ in range(count)]
+
+
+def timed(description: str, operation: Callable, values: List[str]) -> float:
+    start = time.perf_counter()
+    for v in values:
+        operation(v)
+    elapsed = time.perf_counter() - start
+    print(f"  {description:<40} {elapsed:.3f}s ({len(values) / elapsed:,.0f}/s)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=50000)
+    parser.add_argument("--distinct", type=int, default=5000, help="Number of distinct values among the samples")
+    args = parser.parse_args()
+    timestamps, dates = samples(args.samples, args.distinct)
+
+    assert all(date_utils.parse_datetime(t) == dateutil_parser.parse(t) for t in timestamps[:1000])
+    assert all(date_utils.convert_to_datetime(d, date_utils.DATE_FORMAT, as_date=True) ==
+               datetime.datetime.strptime(d, date_utils.DATE_FORMAT).date() for d in dates[:1000])
+    date_utils.parse_datetime.cache_clear()
+    date_utils._convert_to_datetime.cache_clear()
+
+    print("ISO-8601 timestamps with offset (amendments dateSort):")
+    before = timed("dateutil.parser.parse", dateutil_parser.parse, timestamps)
+    after = timed("parse_datetime", date_utils.parse_datetime, timestamps)
+    print(f"  speed-up: x{before / after:.1f}")
+
+    print("ISO-8601 timestamps converted to local time:")
+    before = timed("fromisoformat().astimezone()", lambda t: datetime.datetime.fromisoformat(t).astimezone(tz=None),
+                   timestamps)
+    after = timed("convert_to_datetime", date_utils.convert_to_datetime, timestamps)
+    print(f"  speed-up: x{before / after:.1f}")
+
+    print(f"{date_utils.DATE_FORMAT} dates (dateDepot, dateNais, viMoDe):")
+    before = timed("strptime().date()", lambda d: datetime.datetime.strptime(d, date_utils.DATE_FORMAT).date(), dates)
+    after = timed("convert_to_datetime(as_date=True)",
+                  lambda d: date_utils.convert_to_datetime(d, date_utils.DATE_FORMAT, as_date=True), dates)
+    print(f"  speed-up: x{before / after:.1f}")
+
+
+if __name__ == "__main__":
+    main()
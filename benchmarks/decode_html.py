@@ -0,0 +1,93 @@
+"""
+Golden-output check and timings of decode_html_french_string against the BeautifulSoup implementation it replaces.
+
+    python -m benchmarks.decode_html [--archive amendments.zip] [--samples 20000]
+
+Fails (exit code 1) when any output differs from BeautifulSoup's. The generated samples are also checked by
+tests/test_string_utils.py, this script is for the timings and for the samples of a real export.
+"""
+import argparse
+import html
+import random
+import sys
+import time
+from typing import List, Callable
+
+import orjson
+from bs4 import BeautifulSoup
+
+from shared.utils import ZipSource, get
+from shared.utils import string_utils
+
+FRAGMENTS = ["<p>", "</p>", "<b>", "</b>", "<P class=\"x\">", "<span style='a:b'>", "</span>", "<br/>", "<br>", "<ul>",
+             "<li>", "</li>", "</ul>", "&nbsp;", "&eacute;", "&amp;", "&rsquo;", "&lt;", "&#8217;", "&foo;", "&", ";",
+             "#", "Article ", "amendement", "\n", " ", "\t", "\xa0", "é", "<pre>", "<em>", "</em>", "<sup>", "<rt>",
+             "<script>", "</script>", "<!--", "-->", "<![CDATA[", "]]>", "<", ">", "'", '"',
+             "<a href=\"http://x?a=1&b=2\">", "</a>", "<img src=x alt='y'/>"]
+
+
+def reference(string: str) -> str:
+    return BeautifulSoup(html.unescape(string).replace("\xa0", u" "), features="html.parser").get_text()
+
+
+def synthetic_samples(count: int) -> List[str]:
+    random.seed(42)
+    return ["".join(random.choice(FRAGMENTS) for _ in range(random.randint(0, 30))) for _ in range(count)]
+
+
+def realistic_samples(count: int) -> List[str]:
+    random.seed(7)
+    boilerplate = ["<p>Supprimer cet article.</p>", "<p>Rédiger ainsi cet article :</p>", "", "",
+                   "<p>Amendement de coordination.</p>", "<p>Amendement rédactionnel.</p>"]
+    words = ["le", "la", "des", "article", "alinéa", "loi", "l&rsquo;État", "d&rsquo;une", "au", "premier", "code",
+             "<b>I.</b>", "&laquo;&nbsp;", "&nbsp;&raquo;", "sécurité", "sociale", "2024", "–", "mots", "remplacer"]
+
+    def paragraph():
+        return "<p>" + " ".join(random.choice(words) for _ in range(random.randint(5, 60))) + "</p>"
+
+    return [random.choice(boilerplate) if random.random() < 0.4 else
+            "".join(paragraph() for _ in range(random.randint(1, 6))) for _ in range(count)]
+
+
+def archive_samples(path: str) -> List[str]:
+    samples = []
+    with ZipSource(path, extension="json") as archive:
+        for _, data in archive:
+            amendment = orjson.loads(data).get("amendement", {})
+            samples += [get(amendment, "corps", "contenuAuteur", "dispositif", default=""),
+                        get(amendment, "corps", "contenuAuteur", "exposeSommaire", default="")]
+    return [s for s in samples if isinstance(s, str)]
+
+
+def timed(operation: Callable, samples: List[str]) -> float:
+    start = time.perf_counter()
+    for s in samples:
+        operation(s)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--archive", help="Amendments export (zip) to take real samples from")
+    parser.add_argument("--samples", type=int, default=20000, help="Number of generated samples")
+    args = parser.parse_args()
+
+    corpus = archive_samples(args.archive) if args.archive else realistic_samples(args.samples)
+    samples = synthetic_samples(args.samples) + corpus
+    mismatches = [s for s in samples if string_utils.decode_html_french_string(s) != reference(s)]
+    print(f"{len(samples)} samples, {len(mismatches)} mismatches")
+    for s in mismatches[:10]:
+        print(f"  {s!r}: expected {reference(s)!r}, got {string_utils.decode_html_french_string(s)!r}")
+
+    samples = corpus
+    string_utils._decode_markup.cache_clear()
+    reference_time = timed(reference, samples)
+    cold_time = timed(string_utils.decode_html_french_string, samples)
+    warm_time = timed(string_utils.decode_html_french_string, samples)
+    print(f"BeautifulSoup: {reference_time:.3f}s, decode_html_french_string: {cold_time:.3f}s "
+          f"(x{reference_time / cold_time:.1f}), cached: {warm_time:.3f}s (x{reference_time / warm_time:.1f})")
+    sys.exit(1 if len(mismatches) > 0 else 0)
+
+
+if __name__ == "__main__":
+    main()
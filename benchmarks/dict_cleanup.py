@@ -0,0 +1,172 @@
+"""
+Time and peak memory of the in-place export cleanup against the copying delete_keys_from_dict it replaces, on
+synthetic actor and amendment exports (nested dicts and lists carrying @xmlns / @xsi:* noise), then of the cleanup
+fused with JSON decoding in the reader workers against reading then cleaning in the main process.
+
+The copying version never descended into lists, so it does less work on actors, whose addresses and mandates are lists:
+it is also measured with lists handled, and the in-place walk with the unread mandates skipped, as the actors job does.
+
+    python -m benchmarks.dict_cleanup [--actors 5000] [--amendments 20000] [--workers 8]
+"""
+import argparse
+import copy
+import datetime
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from functools import partial
+from typing import Callable, Dict, List
+
+import orjson
+
+from shared.utils import delete_keys_from_dict, read_json_member, wrap_around_executor_progress_bar, ZipSource
+from .generator import amendment
+
+KEYS = ["@xmlns", "@xmlns:xsi", "@xsi:nil", "@xsi:type"]
+UNREAD_DATA = frozenset(["mandats"])
+
+
+def copying_delete_keys_from_dict(dictionary, keys: List[str], delete_empty: bool = True):
+    def __delete_keys(d: Dict):
+        cpy = d.copy()
+        for field in cpy.keys():
+            if field in keys:
+                del d[field]
+            if type(cpy[field]) == dict:
+                __delete_keys(d[field])
+                if len(d[field]) <= 0 and delete_empty:
+                    del d[field]
+        return d
+
+    if isinstance(dictionary, List):
+        return [__delete_keys(d) for d in dictionary]
+    else:
+        return __delete_keys(dictionary)
+
+
+def copying_list_aware_delete_keys_from_dict(dictionary, keys: List[str], delete_empty: bool = True):
+    """The copying version, also descending into lists: the same work as the in-place walk."""
+    def __delete_keys(d: Dict):
+        cpy = d.copy()
+        for field in cpy.keys():
+            if field in keys:
+                del d[field]
+            elif type(cpy[field]) == dict:
+                __delete_keys(d[field])
+                if len(d[field]) <= 0 and delete_empty:
+                    del d[field]
+            elif type(cpy[field]) == list:
+                for inner in cpy[field]:
+                    if type(inner) == dict:
+                        __delete_keys(inner)
+        return d
+
+    return [__delete_keys(d) for d in dictionary]
+
+
+def skipping_mandates(dictionary, keys: List[str]):
+    return delete_keys_from_dict(dictionary, keys, skip=UNREAD_DATA)
+
+
+def actor(i: int) -> Dict:
+    nil = {"@xsi:nil": "true"}
+    return {"acteur": {
+        "@xmlns": "http://schemas.assemblee-nationale.fr/referentiel", "@xmlns:xsi": "http://www.w3.org/2001/XMLSchema",
+        "uid": {"@xsi:type": "IdActeur_type", "#text": f"PA{i}"},
+        "etatCivil": {"ident": {"civ": "M.", "prenom": "Jean", "nom": f"Dupont{i}", "alpha": f"Dupont{i}",
+                                "trigramme": nil.copy()},
+                      "infoNaissance": {"dateNais": "1970-01-01", "villeNais": "Paris", "depNais": nil.copy(),
+                                        "paysNais": nil.copy()},
+                      "dateDeces": nil.copy()},
+        "profession": {"libelleCourant": "Avocat", "socProcINSEE": {"catSocPro": "Cadres", "famSocPro": "Cadres"}},
+        "adresses": {"adresse": [{"@xsi:type": "AdressePostale_Type", "uid": f"AD{i}-{j}", "type": "0",
+                                  "typeLibelle": "Adresse officielle", "poids": nil.copy(), "nomRue": "rue",
+                                  "complementAdresse": nil.copy()} for j in range(random.randint(1, 6))]},
+        "mandats": {"mandat": [{"@xsi:type": "MandatSimple_Type", "uid": f"PM{i}-{j}", "suppleants": nil.copy(),
+                                "organes": {"organeRef": f"PO{j}"}} for j in range(random.randint(1, 20))]}
+    }}
+
+
+def measure(description: str, operation: Callable, data: List[Dict], repeat: int = 5) -> float:
+    elapsed = float("inf")
+    for _ in range(repeat):
+        copied = copy.deepcopy(data)
+        start = time.perf_counter()
+        operation(copied, KEYS)
+        elapsed = min(elapsed, time.perf_counter() - start)
+
+    copied = copy.deepcopy(data)
+    tracemalloc.start()
+    operation(copied, KEYS)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {description:<45} {elapsed:.3f}s, peak {peak / 1024:.1f} KiB allocated")
+    return elapsed
+
+
+def fused_read(data: List[Dict], workers: int):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "actors.zip")
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+            for i, d in enumerate(data):
+                archive.writestr(f"acteur/PA{i}.json", orjson.dumps(d))
+        names = ZipSource(path).names
+
+        def read_then_clean():
+            decoded = wrap_around_executor_progress_bar(partial(read_json_member, path), names, "Reading",
+                                                        workers=workers)
+            return copying_delete_keys_from_dict(decoded, KEYS)
+
+        def read_cleaned():
+            read = partial(read_json_member, path, drop_keys=frozenset(KEYS), skip_keys=UNREAD_DATA)
+            return wrap_around_executor_progress_bar(read, names, "Reading", workers=workers)
+
+        print(f"Reading and cleaning {len(names)} archive members with {workers} workers:")
+        timings = []
+        for description, operation in [("read, then clean serially", read_then_clean),
+                                        ("cleaned while decoding", read_cleaned)]:
+            start = time.perf_counter()
+            operation()
+            timings.append(time.perf_counter() - start)
+            print(f"  {description:<45} {timings[-1]:.3f}s")
+        print(f"  speed-up: x{timings[0] / timings[1]:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--actors", type=int, default=5000)
+    parser.add_argument("--amendments", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    random.seed(42)
+    data = [actor(i) for i in range(args.actors)]
+
+    expected = copying_delete_keys_from_dict(copy.deepcopy(data), KEYS)
+    cleaned = delete_keys_from_dict(copy.deepcopy(data), KEYS)
+    # The in-place walk also cleans dicts inside lists, which the copying version skipped
+    for e, c in zip(expected, cleaned):
+        assert e["acteur"]["etatCivil"] == c["acteur"]["etatCivil"]
+        assert e["acteur"]["uid"] == c["acteur"]["uid"]
+        assert all(not any(k in KEYS for k in a) for a in c["acteur"]["adresses"]["adresse"])
+
+    print(f"Cleaning {args.actors} actor exports:")
+    measure("copying, lists left as they are (previous)", copying_delete_keys_from_dict, data)
+    measure("copying, lists cleaned", copying_list_aware_delete_keys_from_dict, data)
+    measure("in-place, lists cleaned", delete_keys_from_dict, data)
+    measure("in-place, unread mandates skipped (job)", skipping_mandates, data)
+
+    rng = random.Random(42)
+    start = datetime.datetime(2022, 7, 1, tzinfo=datetime.timezone.utc)
+    amendments = [amendment(rng, i, start) for i in range(args.amendments)]
+    print(f"Cleaning {args.amendments} amendment exports:")
+    measure("copying (previous)", copying_delete_keys_from_dict, amendments)
+    measure("in-place", delete_keys_from_dict, amendments)
+
+    fused_read(data, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Offline end to end benchmark of the amendments and deputies jobs. Synthetic exports (see benchmarks.generator) are
+served by a local HTTP server, the jobs table is kept in memory and rows are written to SQLite, or to the database
+configured with the SQL_* variables when --sql-engine is not sqlite.
+
+Each job runs on an empty database, then again on the same archive (not modified), then on an amendments archive
+where --changed-fraction of the amendments changed. Timings, per stage metrics and row counts are written as JSON.
+
+    python -m benchmarks.end_to_end [--amendments 20000] [--actors 2000] [--organs 1000] [--output results.json]
+"""
+import argparse
+import json
+import logging
+import multiprocessing.util
+import os
+import platform
+import shutil
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from dependency_injector import providers
+from sqlalchemy import select, func
+
+from shared import Environment
+from shared.components import Database
+from shared.components.models import Base
+from shared.context import application
+from shared.functions import amendments, deputies
+from shared.utils import METRICS_PREFIX
+from .fakes import InMemoryJobsTable
+from .generator import write_amendments_archive, write_deputies_archive
+from .server import OpenDataServer
+
+AMENDMENTS_ARCHIVE = "Amendements.json.zip"
+DEPUTIES_ARCHIVE = "AMO10_deputes_actifs_mandats_actifs_organes.json.zip"
+
+
+def stage_metrics(record: Dict) -> Dict[str, float]:
+    return {k[len(METRICS_PREFIX):]: v for k, v in record.items() if k.startswith(METRICS_PREFIX)}
+
+
+def row_counts() -> Dict[str, int]:
+    with Database.get_session() as session:
+        return {t.name: session.execute(select(func.count()).select_from(t)).scalar_one()
+                for t in Base.metadata.sorted_tables}
+
+
+def run_job(scenario: str, name: str, job: Callable, jobs: InMemoryJobsTable) -> Dict:
+    before = jobs.get_last_run(name).get("run_datetime")
+    start = time.perf_counter()
+    job()
+    elapsed = time.perf_counter() - start
+    record = jobs.get_last_run(name)
+    skipped = record.get("run_datetime") == before
+    result = {"scenario": scenario, "job": name, "wall_time_s": round(elapsed, 3), "skipped": skipped,
+              "stages": {} if skipped else stage_metrics(record), "rows": row_counts()}
+    print(f"{scenario:<12} {name:<11} {elapsed:8.2f}s{' (skipped)' if skipped else ''}")
+    return result
+
+
+def configure(workdir: str, sql_engine: str, workers: int):
+    # The forkserver of the process pools keeps its socket in a temporary directory removed at exit, created here
+    # before the downloads are redirected to the work directory (removed first)
+    multiprocessing.util.get_temp_dir()
+    tempfile.tempdir = os.path.join(workdir, "downloads")
+    os.makedirs(tempfile.tempdir, exist_ok=True)
+    Environment.parallel_workers = str(workers) if workers is not None else None
+    if sql_engine == "sqlite":
+        Database.init_with_credentials("sqlite", None, None, None, None, os.path.join(workdir, "benchmark.db"))
+    else:
+        Database.init_with_credentials(sql_engine, Environment.sql_user, Environment.sql_password,
+                                       Environment.sql_host, Environment.sql_port, Environment.sql_database)
+    with Database.get_session() as session:
+        Base.metadata.drop_all(session.get_bind())
+        Base.metadata.create_all(session.get_bind())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--amendments", type=int, default=20000)
+    parser.add_argument("--actors", type=int, default=2000)
+    parser.add_argument("--organs", type=int, default=1000)
+    parser.add_argument("--changed-fraction", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--sql-engine", choices=["sqlite", "postgres", "mssql"], default="sqlite")
+    parser.add_argument("--workdir", default=None, help="Kept after the run when given")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="state-tracker-benchmark-")
+    www = os.path.join(workdir, "www")
+    configure(workdir, args.sql_engine, args.workers)
+
+    start = time.perf_counter()
+    write_amendments_archive(os.path.join(www, AMENDMENTS_ARCHIVE), args.amendments, args.seed)
+    write_deputies_archive(os.path.join(www, DEPUTIES_ARCHIVE), args.actors, args.organs, args.seed)
+    print(f"Generated archives in {time.perf_counter() - start:.1f}s")
+
+    jobs = InMemoryJobsTable()
+    application.gateways.jobs_table.override(providers.Object(jobs))
+    results: List[Dict] = []
+    try:
+        with OpenDataServer(www) as server:
+            Environment.amendments_url = server.url(AMENDMENTS_ARCHIVE)
+            Environment.deputies_url = server.url(DEPUTIES_ARCHIVE)
+
+            for scenario in ["initial", "unchanged"]:
+                results.append(run_job(scenario, "deputies", deputies, jobs))
+                results.append(run_job(scenario, "amendments", amendments, jobs))
+
+            write_amendments_archive(os.path.join(www, AMENDMENTS_ARCHIVE), args.amendments, args.seed,
+                                     changed_fraction=args.changed_fraction, revision=1)
+            results.append(run_job("incremental", "amendments", amendments, jobs))
+    finally:
+        application.gateways.jobs_table.reset_override()
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, "w") as f:
+        json.dump({"configuration": {**vars(args), "python": platform.python_version(), "cpus": os.cpu_count()},
+                   "results": results}, f, indent=2, default=str)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+In-memory stand-ins for the Azure services, so the jobs can run offline.
+"""
+import copy
+import re
+import threading
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceNotFoundError, ResourceExistsError, ResourceModifiedError
+from azure.data.tables import TableEntity
+
+from shared.components import JobsTable
+
+
+class InMemoryTableClient:
+    """Keeps entities with an ETag changed on every write, and honours IfNotModified conditions."""
+    entities: Dict[Tuple[str, str], Tuple[Dict, str]]
+
+    def __init__(self):
+        self.entities = {}
+        self._lock = threading.Lock()
+
+    def _entity(self, key: Tuple[str, str]) -> TableEntity:
+        data, etag = self.entities[key]
+        entity = TableEntity(copy.deepcopy(data))
+        entity._metadata = {"etag": etag, "timestamp": None}
+        return entity
+
+    def _write(self, entity: Dict) -> Dict:
+        etag = f'W/"{uuid.uuid4()}"'
+        self.entities[(entity["PartitionKey"], entity["RowKey"])] = (copy.deepcopy(dict(entity)), etag)
+        return {"etag": etag}
+
+    def _check(self, key: Tuple[str, str], etag: Optional[str], match_condition: Optional[MatchConditions]):
+        if key not in self.entities:
+            raise ResourceNotFoundError(f"Entity {key[0]}/{key[1]} not found")
+        if match_condition == MatchConditions.IfNotModified and self.entities[key][1] != etag:
+            raise ResourceModifiedError(f"Entity {key[0]}/{key[1]} was modified")
+
+    def get_entity(self, partition_key: str, row_key: str) -> TableEntity:
+        with self._lock:
+            if (partition_key, row_key) not in self.entities:
+                raise ResourceNotFoundError(f"Entity {partition_key}/{row_key} not found")
+            return self._entity((partition_key, row_key))
+
+    def create_entity(self, entity: Dict) -> Dict:
+        with self._lock:
+            if (entity["PartitionKey"], entity["RowKey"]) in self.entities:
+                raise ResourceExistsError(f"Entity {entity['PartitionKey']}/{entity['RowKey']} already exists")
+            return self._write(entity)
+
+    def upsert_entity(self, entity: Dict, mode=None) -> Dict:
+        with self._lock:
+            return self._write(entity)
+
+    def update_entity(self, entity: Dict, mode=None, etag: Optional[str] = None,
+                      match_condition: Optional[MatchConditions] = None) -> Dict:
+        with self._lock:
+            self._check((entity["PartitionKey"], entity["RowKey"]), etag, match_condition)
+            return self._write(entity)
+
+    def delete_entity(self, partition_key: str, row_key: str, etag: Optional[str] = None,
+                      match_condition: Optional[MatchConditions] = None):
+        with self._lock:
+            if (partition_key, row_key) not in self.entities:
+                return
+            self._check((partition_key, row_key), etag, match_condition)
+            del self.entities[(partition_key, row_key)]
+
+    def query_entities(self, query_filter: str) -> List[TableEntity]:
+        partition_key = re.search(r"PartitionKey eq '([^']*)'", query_filter).group(1)
+        with self._lock:
+            return [self._entity(k) for k in self.entities if k[0] == partition_key]
+
+
+class InMemoryJobsTable(JobsTable):
+    def __init__(self):
+        self._table_client = InMemoryTableClient()
@@ -0,0 +1,215 @@
+"""
+Synthetic Assemblée nationale open data exports: amendments, and actors / organs trees with their addresses and
+professions, laid out like the real archives and carrying the same @xmlns / @xsi:* noise (organs use plain nulls).
+
+    python -m benchmarks.generator <output_directory> [--amendments 20000] [--actors 2000] [--organs 1000]
+"""
+import argparse
+import datetime
+import os
+import random
+import zipfile
+from typing import Dict, List, Optional
+
+import orjson
+
+NIL = {"@xsi:nil": "true"}
+XMLNS = {"@xmlns": "http://schemas.assemblee-nationale.fr/referentiel",
+         "@xmlns:xsi": "http://www.w3.org/2001/XMLSchema-instance"}
+STATES = ["Discuté", "En traitement", "Irrecevable", "Retiré", "A discuter"]
+SUB_STATES = ["Adopté", "Rejeté", "Non soutenu", "Tombé", None]
+ORGAN_TYPES = ["ASSEMBLEE", "COMPER", "GP", "PARPOL", "CIRCONSCRIPTION", "GE", "DELEG", "CNPE", "MISINFO"]
+PROFESSIONS = [("Avocat", "Cadres et professions intellectuelles supérieures", "Professions libérales"),
+               ("Agriculteur", "Agriculteurs exploitants", "Agriculteurs exploitants"),
+               ("Professeur", "Cadres et professions intellectuelles supérieures", "Professeurs"),
+               ("Médecin", "Cadres et professions intellectuelles supérieures", "Professions libérales"),
+               ("Cadre du secteur privé", "Cadres et professions intellectuelles supérieures", "Cadres d'entreprise"),
+               ("Retraité", "Retraités", "Retraités")]
+WORDS = ["alinéa", "article", "supprimer", "rédiger", "ainsi", "suivante", "loi", "dispositif", "présent", "compter",
+         "publication", "gouvernement", "rapport", "Parlement", "mois", "décret", "conditions", "collectivités"]
+
+
+def _text(rng: random.Random, words: int, markup: bool = True) -> str:
+    sentence = " ".join(rng.choice(WORDS) for _ in range(words))
+    if not markup:
+        return sentence
+    return f"<p>{sentence}&#160;:</p><p style=\"text-align: justify;\">« {rng.choice(WORDS)} » </p>"
+
+
+def _moment(rng: random.Random, start: datetime.datetime, days: int) -> datetime.datetime:
+    return start + datetime.timedelta(seconds=rng.randint(0, days * 24 * 3600))
+
+
+def amendment(rng: random.Random, i: int, start: datetime.datetime, days: int = 365, revision: int = 0) -> Dict:
+    deposit = _moment(rng, start, days)
+    sort = deposit + datetime.timedelta(days=rng.randint(0, 30)) if rng.random() > 0.1 else None
+    sub_state = rng.choice(SUB_STATES)
+    return {"amendement": {
+        **XMLNS,
+        "uid": f"AMANR5L16PO{420120 + i % 50}B{i % 1000:04d}P0D1N{i:06d}",
+        "chronotag": f"L16/{i}",
+        "legislature": "16",
+        "identification": {"numeroLong": str(i), "numeroOrdreDepot": str(i), "prefixeOrganeExamen": "AN"},
+        "examenRef": f"EXANR5L16PO{420120 + i % 50}B{i % 1000:04d}P0D1",
+        "triAmendement": rng.choice(["", f"{i:06d}", NIL]),
+        "texteLegislatifRef": f"PRJLANR5L16B{i % 1000:04d}",
+        "signataires": {"auteur": {"typeAuteur": "Député", "acteurRef": f"PA{rng.randint(1, 5000)}",
+                                   "groupePolitiqueRef": f"PO{rng.randint(1, 20)}"},
+                        "cosignataires": {"acteurRef": [f"PA{rng.randint(1, 5000)}" for _ in range(rng.randint(0, 8))]},
+                        "libelle": _text(rng, 6, markup=False)},
+        "pointeurFragmentTexte": {"division": {"titre": f"Article {i % 40}", "type": "ARTICLE",
+                                               "avant_A_Apres": "A", "articleAdditionnel": "false"}},
+        "corps": {"contenuAuteur": {"dispositif": _text(rng, rng.randint(5, 60)) + ("x" * revision),
+                                    "exposeSommaire": _text(rng, rng.randint(20, 200))}},
+        "representations": {"representation": {"nom": "PDF", "typeMime": {"type": "application", "subType": "pdf"},
+                                                "statutRepresentation": {"verbatim": "false", "canonique": "true"},
+                                                "contenu": {"documentURI": f"/dyn/opendata/AMANR5L16-{i}.pdf"}}},
+        "article99": rng.choice(["true", "false"]),
+        "cycleDeVie": {
+            "dateDepot": deposit.strftime("%Y-%m-%d"),
+            "datePublication": (deposit + datetime.timedelta(days=1)).strftime("%Y-%m-%d"),
+            "dateSort": sort.isoformat(timespec="milliseconds") if sort is not None else NIL,
+            "soumisArticle40": "false",
+            "etatDesTraitements": {"etat": {"code": "DI", "libelle": rng.choice(STATES)},
+                                   "sousEtat": {"code": "ADO", "libelle": sub_state} if sub_state else NIL}
+        }
+    }}
+
+
+def organ(rng: random.Random, i: int, parent: Optional[str]) -> Dict:
+    organ_type = rng.choice(ORGAN_TYPES)
+    start = _moment(rng, datetime.datetime(1990, 1, 1), 365 * 30)
+    data = {
+        "@xsi:type": "OrganeParlementaire_Type", **XMLNS,
+        "uid": f"PO{i}",
+        "codeType": organ_type,
+        "libelle": f"{organ_type.title()} {_text(rng, 3, markup=False)}",
+        "libelleEdition": _text(rng, 4, markup=False),
+        "libelleAbrege": _text(rng, 2, markup=False),
+        "libelleAbrev": f"{organ_type[:3]}{i}",
+        "viMoDe": {"dateDebut": start.strftime("%Y-%m-%d"), "dateAgrement": None,
+                   "dateFin": (start + datetime.timedelta(days=365 * 5)).strftime("%Y-%m-%d")
+                   if rng.random() > 0.3 else None},
+        "organeParent": parent if parent is not None else None,
+        "chambre": None,
+        "regime": "5ème République",
+        "legislature": str(rng.randint(9, 16)) if rng.random() > 0.2 else None,
+        "secretariat": {"secretaire01": None, "secretaire02": None},
+    }
+    if organ_type == "CIRCONSCRIPTION":
+        data["numero"] = str(rng.randint(1, 20))
+        data["lieu"] = {"region": {"type": "Métropolitain", "libelle": "Île-de-France"},
+                        "departement": {"code": f"{rng.randint(1, 95):02d}", "libelle": "Paris"}}
+    return {"organe": data}
+
+
+def _address(rng: random.Random, actor: int, j: int) -> Dict:
+    kind = rng.choice(["postal", "mail", "phone"])
+    common = {"uid": f"AD{actor}-{j}", "poids": str(rng.randint(0, 100)) if rng.random() > 0.5 else NIL,
+              "adresseDeRattachement": NIL}
+    match kind:
+        case "postal":
+            return {"@xsi:type": "AdressePostale_Type", **common, "type": "0", "typeLibelle": "Adresse officielle",
+                    "intitule": NIL, "numeroRue": str(rng.randint(1, 200)), "nomRue": "rue de l'Université",
+                    "complementAdresse": NIL, "codePostal": "75355", "ville": "Paris 07 SP"}
+        case "mail":
+            return {"@xsi:type": "AdresseMail_Type", **common, "type": "15", "typeLibelle": "Mèl",
+                    "valElec": f"depute{actor}@assemblee-nationale.fr"}
+        case _:
+            return {"@xsi:type": "AdresseTelephonique_Type", **common, "type": "11", "typeLibelle": "Téléphone",
+                    "valElec": f"01 40 63 {rng.randint(10, 99)} {rng.randint(10, 99)}"}
+
+
+def actor(rng: random.Random, i: int, organs: List[str]) -> Dict:
+    profession = rng.choice(PROFESSIONS)
+    addresses = [_address(rng, i, j) for j in range(rng.randint(1, 6))]
+    birth = _moment(rng, datetime.datetime(1940, 1, 1), 365 * 50)
+    return {"acteur": {
+        **XMLNS,
+        "uid": {"@xsi:type": "IdActeur_type", "#text": f"PA{i}"},
+        "etatCivil": {
+            "ident": {"civ": rng.choice(["M.", "Mme"]), "prenom": f"Prénom{i}", "nom": f"Nom{i}",
+                      "alpha": f"Nom{i}", "trigramme": NIL},
+            "infoNaissance": {"dateNais": birth.strftime("%Y-%m-%d"), "villeNais": "Paris",
+                              "depNais": NIL if rng.random() > 0.5 else "Paris", "paysNais": NIL},
+            "dateDeces": NIL if rng.random() > 0.05 else (birth + datetime.timedelta(days=365 * 70)).strftime("%Y-%m-%d")
+        },
+        "profession": {"libelleCourant": profession[0],
+                       "socProcINSEE": {"catSocPro": profession[1], "famSocPro": profession[2]}},
+        "uri_hatvp": f"https://www.hatvp.fr/pages_nominatives/nom{i}",
+        "adresses": {"adresse": addresses if len(addresses) > 1 else addresses[0]},
+        "mandats": {"mandat": [{"@xsi:type": "MandatParlementaire_type", "uid": f"PM{i}-{j}", "acteurRef": f"PA{i}",
+                                "legislature": "16", "typeOrgane": "ASSEMBLEE", "suppleants": NIL,
+                                "organes": {"organeRef": rng.choice(organs)}} for j in range(rng.randint(1, 8))]}
+    }}
+
+
+def write_archive(path: str, members: Dict[str, Dict]):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+        for name, data in members.items():
+            archive.writestr(name, orjson.dumps(data, option=orjson.OPT_INDENT_2))
+
+
+def write_amendments_archive(path: str, count: int, seed: int = 42, changed_fraction: float = 0.0,
+                             revision: int = 0) -> str:
+    """
+    Writes `count` amendments. With a non zero `revision`, `changed_fraction` of them get a different content and a
+    dateSort after the current time, like amendments examined since the previous run.
+    """
+    rng, changes = random.Random(seed), random.Random(seed + revision)
+    start = datetime.datetime(2022, 7, 1, tzinfo=datetime.timezone(datetime.timedelta(hours=2)))
+    members = {}
+    for i in range(count):
+        data = amendment(rng, i, start)
+        if revision > 0 and changes.random() < changed_fraction:
+            data = amendment(random.Random(seed * 1000 + i), i, datetime.datetime.now(start.tzinfo), days=1,
+                             revision=revision)
+        members[f"json/PRJLANR5L16B{i % 1000:04d}/{data['amendement']['uid']}.json"] = data
+    write_archive(path, members)
+    return path
+
+
+def write_deputies_archive(path: str, actors: int, organs: int, seed: int = 42, max_depth: int = 4,
+                           orphan_fraction: float = 0.01) -> str:
+    """
+    Writes `organs` organs, as a forest at most `max_depth` levels deep, then `actors` actors. `orphan_fraction` of
+    the organs have a parent missing from the export, like organs whose parent is no longer active.
+    """
+    rng = random.Random(seed)
+    members = {}
+    levels: List[List[str]] = []
+    for i in range(1, organs + 1):
+        depth = rng.randint(0, min(len(levels), max_depth - 1))
+        parent = rng.choice(levels[depth - 1]) if depth > 0 else None
+        if parent is None and rng.random() < orphan_fraction:
+            parent = f"PO{organs + i}"
+        data = organ(rng, i, parent)
+        if depth == len(levels):
+            levels.append([])
+        levels[depth].append(data["organe"]["uid"])
+        members[f"json/organe/{data['organe']['uid']}.json"] = data
+    organ_uids = [u for level in levels for u in level] or ["PO1"]
+    for i in range(1, actors + 1):
+        members[f"json/acteur/PA{i}.json"] = actor(rng, i, organ_uids)
+    write_archive(path, members)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("output_directory")
+    parser.add_argument("--amendments", type=int, default=20000)
+    parser.add_argument("--actors", type=int, default=2000)
+    parser.add_argument("--organs", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(write_amendments_archive(os.path.join(args.output_directory, "Amendements.json.zip"), args.amendments,
+                                   args.seed))
+    print(write_deputies_archive(os.path.join(args.output_directory, "AMO10_deputes_actifs_mandats_actifs_organes.json"
+                                                                     ".zip"), args.actors, args.organs, args.seed))
+
+
+if __name__ == "__main__":
+    main()
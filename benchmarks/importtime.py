@@ -0,0 +1,75 @@
+"""
+Cold start report of the function app: imports it in fresh interpreters with -X importtime, prints its slowest
+imports and fails (exit status 1) when the median import time goes over the budget, or when one of the heavy
+dependencies of the jobs is imported at startup.
+
+    python -m benchmarks.importtime [--module function_app] [--budget-ms 400] [--runs 5] [--top 15]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Only needed once a job runs
+DEFERRED_MODULES = ["sqlalchemy", "azure.cosmos", "azure.data.tables", "bs4", "dateutil", "tqdm", "tqdm_loggable",
+                    "dependency_injector", "pandas", "pyarrow", "requests", "shared.functions", "shared.components"]
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_times(module: str) -> Tuple[int, Dict[str, int], List[str]]:
+    """
+    Cumulative import time of `module` in microseconds, of its direct imports, and the deferred modules it loaded.
+    """
+    probe = f"import sys, {module}; print(','.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", probe], capture_output=True, text=True,
+                            cwd=os.getcwd(), check=True)
+    # Imports are reported once done, so the direct imports of `module` are the top-level + 1 lines preceding it
+    total, children = 0, {}
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match is None:
+            continue
+        cumulative, depth, name = int(match.group(2)), len(match.group(3)) // 2, match.group(4)
+        if depth == 0 and name == module:
+            total = cumulative
+            break
+        if depth == 0:
+            children = {}
+        elif depth == 1:
+            children[name] = cumulative
+    loaded = [m for m in result.stdout.strip().split(",") if len(m) > 0]
+    return total, children, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="function_app")
+    parser.add_argument("--budget-ms", type=float, default=400)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    median_ms = statistics.median(total for total, _, _ in runs) / 1000
+    _, children, loaded = runs[-1]
+
+    print(f"Slowest imports of {args.module} (last run, cumulative):")
+    for name, micros in sorted(children.items(), key=lambda i: i[1], reverse=True)[:args.top]:
+        print(f"  {name:<40} {micros / 1000:8.1f}ms")
+    print(f"Import of {args.module}: {median_ms:.1f}ms (median of {args.runs} runs), budget {args.budget_ms:.0f}ms")
+
+    failed = False
+    if median_ms > args.budget_ms:
+        print(f"FAILED: import time is {median_ms - args.budget_ms:.1f}ms over budget")
+        failed = True
+    if len(loaded) > 0:
+        print(f"FAILED: imported at startup instead of on first run: {', '.join(loaded)}")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
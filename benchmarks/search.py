@@ -0,0 +1,128 @@
+"""
+Latency of the amendments full-text search: the corpus is loaded in an empty database, indexed, then every query is
+run --repeat times through search_amendments and through the LIKE scan it replaces. The reindexing cost of upserting
+--changed-fraction of the amendments is reported too.
+
+The corpus is the amendments of a real export when --archive is given, synthetic otherwise: French legislative words
+drawn with a Zipf distribution, so that queries range from words found in most amendments to rare ones. Rows are
+written to SQLite (LIKE only), or to the database configured with the SQL_* variables when --sql-engine is not sqlite.
+
+    python -m benchmarks.search [--amendments 50000] [--archive Amendements.json.zip] [--sql-engine postgres]
+"""
+import argparse
+import datetime
+import importlib
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from functools import partial
+from typing import Callable, Dict, List, Tuple
+
+from shared.components import Amendments, Database, ensure_search_index, search_amendments, upsert_rows
+from shared.components.database import SQLEngine
+from shared.components.search import _like_search
+from shared.utils import ZipSource, read_json_member, batched, delete_keys_from_dict
+from .end_to_end import configure
+from .generator import amendment
+
+# The job module, as the package attribute is the job function
+function = importlib.import_module("shared.functions.amendments.function")
+
+VOCABULARY = ["article", "alinéa", "supprimer", "rédiger", "loi", "présent", "dispositif", "gouvernement", "rapport",
+              "décret", "collectivités", "territoriales", "conditions", "publication", "Parlement", "mois", "compter",
+              "santé", "publique", "énergie", "renouvelable", "logement", "social", "budget", "État", "fiscalité",
+              "impôt", "revenu", "entreprises", "salariés", "retraite", "pension", "agriculture", "agriculteurs",
+              "environnement", "climat", "transition", "écologique", "éducation", "enseignants", "hôpital",
+              "médecins", "sécurité", "police", "justice", "numérique", "données", "personnelles", "transport",
+              "ferroviaire", "outre-mer", "Corse", "eau", "pêche", "montagne", "littoral", "biodiversité", "chasse",
+              "nucléaire", "hydrogène", "carburant", "électricité", "tarif", "consommateurs", "artisans", "commerce",
+              "tourisme", "culture", "patrimoine", "audiovisuel", "sport", "jeunesse", "handicap", "dépendance",
+              "autonomie", "famille", "enfance", "immigration", "asile", "défense", "armées", "diplomatie"]
+QUERIES = ["article", "loi décret", "gouvernement rapport", "santé publique", "énergie renouvelable", "hydrogène",
+           "pêche littoral", "chasse biodiversité montagne", "diplomatie", "inexistant"]
+
+
+def _text(rng: random.Random, words: int) -> str:
+    # Zipf-like: the n-th word of the vocabulary is drawn with a weight of 1 / n
+    return " ".join(rng.choices(VOCABULARY, weights=[1 / (n + 1) for n in range(len(VOCABULARY))], k=words))
+
+
+def synthetic_rows(count: int, seed: int) -> List[Dict]:
+    rng = random.Random(seed)
+    start = datetime.datetime(2022, 7, 1, tzinfo=datetime.timezone.utc)
+    return [{**function.map_to_row(delete_keys_from_dict(amendment(rng, i, start), function.USELESS_DATA)),
+             "contentTitle": _text(rng, rng.randint(5, 60)),
+             "contentSummary": _text(rng, rng.randint(20, 200))} for i in range(count)]
+
+
+def archive_rows(path: str, count: int) -> List[Dict]:
+    with ZipSource(path, extension="json") as source:
+        read = partial(read_json_member, source.path, drop_keys=function.USELESS_DATA)
+        return [function.map_to_row(read(name)) for name in source.names[:count]]
+
+
+def load(rows: List[Dict], batch_size: int = 5000) -> float:
+    start = time.perf_counter()
+    for batch in batched(rows, batch_size):
+        upsert_rows(batch, Amendments.__table__)
+    return time.perf_counter() - start
+
+
+def latencies(search: Callable, query: str, repeat: int) -> Tuple[List[float], int]:
+    timings, hits = [], 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        hits = len(search(query))
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings, hits
+
+
+def report(description: str, timings: List[float], hits: int):
+    p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+    print(f"    {description:<10} p50 {statistics.median(timings):8.2f}ms  p95 {p95:8.2f}ms  {hits} results")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--amendments", type=int, default=50000)
+    parser.add_argument("--archive", default=None, help="Amendments export to search instead of a synthetic corpus")
+    parser.add_argument("--changed-fraction", type=float, default=0.05)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--sql-engine", choices=["sqlite", "postgres", "mssql"], default="sqlite")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="state-tracker-search-")
+    try:
+        configure(workdir, args.sql_engine, None)
+        rows = archive_rows(args.archive, args.amendments) if args.archive is not None else \
+            synthetic_rows(args.amendments, args.seed)
+        print(f"Loaded {len(rows)} amendments in {load(rows):.2f}s")
+
+        start = time.perf_counter()
+        ensure_search_index()
+        print(f"Built the search index in {time.perf_counter() - start:.2f}s")
+
+        # Only the written rows are reindexed, so this grows with the changed amendments and not the table
+        rng = random.Random(args.seed)
+        changed = [{**r, "contentSummary": _text(rng, rng.randint(20, 200))} for r in rows
+                   if rng.random() < args.changed_fraction]
+        print(f"Upserted {len(changed)} changed amendments in {load(changed):.2f}s")
+
+        print(f"Searching (top {args.limit}, {args.repeat} runs per query):")
+        for query in QUERIES:
+            print(f"  {query!r}")
+            report("search", *latencies(partial(search_amendments, limit=args.limit), query, args.repeat))
+            if Database.sql_engine() != SQLEngine.SQLITE:
+                with Database.get_session() as session:
+                    report("LIKE scan", *latencies(partial(_like_search, session, limit=args.limit), query,
+                                                   args.repeat))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Local stand-in for the open data HTTP server: serves a directory with ETag / Last-Modified validators, answers
+conditional requests with 304 Not Modified and open-ended byte ranges (resumed downloads) with 206 Partial Content.
+"""
+import email.utils
+import hashlib
+import os
+import re
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(SimpleHTTPRequestHandler):
+    def log_message(self, *_):
+        pass
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404, "File not found")
+            return None
+
+        stat = os.stat(path)
+        etag = '"' + hashlib.sha1(f"{stat.st_size}-{stat.st_mtime_ns}".encode()).hexdigest() + '"'
+        last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return None
+
+        start, end = 0, stat.st_size - 1
+        requested = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        partial_content = requested is not None and self.headers.get("If-Range", etag) in (etag, last_modified)
+        if partial_content:
+            start = int(requested.group(1))
+
+        f = open(path, "rb")
+        f.seek(start)
+        self.send_response(206 if partial_content else 200)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        if partial_content:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{stat.st_size}")
+        self.end_headers()
+        return f
+
+
+class OpenDataServer:
+    def __init__(self, directory: str):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), partial(_Handler, directory=directory))
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def url(self, name: str) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/{name}"
+
+    def __enter__(self) -> "OpenDataServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self._server.shutdown()
+        self._server.server_close()
@@ -4,24 +4,27 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from shared.functions import amendments, deputies
-
+# Jobs are imported by their function on first run, so that the host indexes the functions without loading SQLAlchemy,
+# the Azure SDKs and the rest of the jobs dependencies
 app = func.FunctionApp()
 
 
 @app.function_name(name="amendments")
 @app.schedule(schedule="*/5 * * * * *", arg_name="mytimer", run_on_startup=True)
 def load_amendments(mytimer: func.TimerRequest) -> None:
+    from shared.functions import amendments
     amendments()
 
 
 @app.function_name(name="deputies")
 @app.schedule(schedule="*/5 * * * * *", arg_name="mytimer", run_on_startup=True)
 def load_deputies(mytimer: func.TimerRequest) -> None:
+    from shared.functions import deputies
     deputies()
 
 if __name__ == '__main__':
     from shared.utils.dev import dev_with_pycharm
+    from shared.functions import amendments, deputies
 
     # dev_with_pycharm()
 
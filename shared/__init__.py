@@ -1,3 +1,15 @@
-from .functions import *
-from .env import Environment
-from .context import Application, Gateways
+from typing import TYPE_CHECKING
+
+from .utils.lazy_utils import lazy_exports
+
+# Importing `shared` is free, the jobs, their settings and the application container are imported on first use
+__getattr__, __dir__ = lazy_exports(__name__, {
+    ".functions": ["amendments", "deputies"],
+    ".env": ["Environment"],
+    ".context": ["Application", "Gateways"],
+})
+
+if TYPE_CHECKING:
+    from .functions import amendments, deputies
+    from .env import Environment
+    from .context import Application, Gateways
@@ -1,4 +1,25 @@
-from .cosmos import Cosmos
-from .jobs import JobsTable
-from .database import Database, insert_or_update, drop_data_json_entry
-from .models import Amendments, Professions, Actors, ActorsAddresses, Organs
+from typing import TYPE_CHECKING
+
+from ..utils.lazy_utils import lazy_exports
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    ".cosmos": ["Cosmos", "BulkResult"],
+    ".jobs": ["JobsTable", "Lease", "LeaseLostError"],
+    ".database": ["Database", "insert_or_update", "drop_data_json_entry", "existing_keys", "bulk_upsert",
+                  "keep_changed", "drop_unchanged_entities", "upsert_rows", "depth_levels", "upsert_levels",
+                  "ensure_columns"],
+    ".full_load": ["bulk_load", "bulk_load_rows", "is_empty"],
+    ".search": ["ensure_search_index", "search_amendments"],
+    ".models": ["Amendments", "Professions", "Actors", "ActorsAddresses", "Organs"],
+    ".mapping": ["Field", "FieldSpec"],
+})
+
+if TYPE_CHECKING:
+    from .cosmos import Cosmos, BulkResult
+    from .jobs import JobsTable, Lease, LeaseLostError
+    from .database import Database, insert_or_update, drop_data_json_entry, existing_keys, bulk_upsert, keep_changed, \
+        drop_unchanged_entities, upsert_rows, depth_levels, upsert_levels, ensure_columns
+    from .full_load import bulk_load, bulk_load_rows, is_empty
+    from .search import ensure_search_index, search_amendments
+    from .models import Amendments, Professions, Actors, ActorsAddresses, Organs
+    from .mapping import Field, FieldSpec
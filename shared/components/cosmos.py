@@ -1,12 +1,48 @@
-import datetime
 import logging
+import threading
 import time
-from typing import Mapping, Optional, List, Iterator, MutableMapping
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED, ALL_COMPLETED
+from dataclasses import dataclass, field
+from typing import Mapping, Optional, List, Iterator, MutableMapping, Any, Callable, Dict, Iterable, Tuple, Set, \
+    Sized
 
 from azure.cosmos import CosmosClient, ContainerProxy, DatabaseProxy
-from azure.cosmos.exceptions import CosmosHttpResponseError
+from azure.cosmos.exceptions import CosmosHttpResponseError, CosmosBatchOperationError
 from tqdm_loggable.auto import tqdm
 
+TRANSACTIONAL_BATCH_LIMIT = 100
+DEFAULT_CONCURRENCY = 16
+DEFAULT_MAX_RETRIES = 5
+# Items waiting in partial per-partition chunks before they are all sent, when streaming items
+STREAM_BUFFER_LIMIT = 10 * TRANSACTIONAL_BATCH_LIMIT
+
+
+@dataclass
+class BulkResult:
+    succeeded: int = 0
+    failed: int = 0
+    request_charge: float = 0.0
+    elapsed: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def throughput(self) -> float:
+        return self.succeeded / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def request_units_per_second(self) -> float:
+        return self.request_charge / self.elapsed if self.elapsed > 0 else 0.0
+
+    def charge(self, headers: Mapping[str, str], *_):
+        with self._lock:
+            self.request_charge += float(headers.get("x-ms-request-charge", 0))
+
+    def count(self, succeeded: int = 0, failed: int = 0):
+        with self._lock:
+            self.succeeded += succeeded
+            self.failed += failed
+
 
 class Cosmos:
     _client: CosmosClient
@@ -32,55 +68,159 @@ class Cosmos:
         self._partition_key = partition_key
 
     def upsert(self, item: MutableMapping):
-        self._container.upsert_item(item)
+        self._container.upsert_item(dict(item))
 
-    # TODO : reduce code duplication with Results and a single upsert method
     def upsert_all(self, items: List[MutableMapping], id_key: Optional[str] = None, with_progress_bar: bool = True):
-        logging.info(f"Upserting {len(items)} items")
-        errors = []
-        with tqdm(total=len(items), desc="Upserting elements", unit_scale=True) as bar:
-            for i in range(len(items)):
-                item = items[i]
+        self.bulk_upsert(items, id_key, with_progress_bar=with_progress_bar)
+
+    def upsert_each(self, items: Iterator[MutableMapping], id_key: Optional[str] = None):
+        self.bulk_upsert(items, id_key, with_progress_bar=False)
+
+    def _partition_value(self, item: Mapping) -> Any:
+        value: Any = item
+        for k in self._partition_key.strip("/").split("/"):
+            value = value.get(k) if isinstance(value, Mapping) else None
+        return value
+
+    @staticmethod
+    def _with_retries(operation: Callable[[], Any], max_retries: int) -> None:
+        for attempt in range(max_retries + 1):
+            try:
+                operation()
+                return
+            except CosmosHttpResponseError as e:
+                if e.status_code != 429 or attempt >= max_retries:
+                    raise
+                retry_after = (e.headers or {}).get("x-ms-retry-after-ms")
+                time.sleep(float(retry_after) / 1000 if retry_after is not None else 0.1 * 2 ** attempt)
+
+    def _run_chunk(self, partition_value: Any, chunk: List, operation: str, to_batch_arguments: Callable,
+                   single: Callable, result: BulkResult, use_batches: bool, max_retries: int) -> int:
+        if use_batches and len(chunk) > 1:
+            try:
+                self._with_retries(lambda: self._container.execute_item_batch(
+                    [(operation, to_batch_arguments(x)) for x in chunk], partition_key=partition_value,
+                    response_hook=result.charge), max_retries)
+                result.count(succeeded=len(chunk))
+                return len(chunk)
+            except (CosmosHttpResponseError, CosmosBatchOperationError) as e:
+                logging.warning(f"Transactional {operation} batch failed ({e.status_code}), falling back to single "
+                                f"requests")
+
+        for x in chunk:
+            try:
+                self._with_retries(lambda: single(x, partition_value, result.charge), max_retries)
+                result.count(succeeded=1)
+            except CosmosHttpResponseError as e:
+                logging.error(f"Could not {operation} item: {e.status_code}")
+                result.count(failed=1)
+        return len(chunk)
+
+    @staticmethod
+    def _chunks(keyed: Iterable[Tuple[Any, Any]], chunk_size: int,
+                buffer_limit: int = STREAM_BUFFER_LIMIT) -> Iterator[Tuple[Any, List]]:
+        """
+        Groups (partition value, element) pairs into chunks of at most `chunk_size` elements of a single partition, as
+        they come. Partial chunks are sent once `buffer_limit` elements wait in them, and at the end.
+        """
+        buffers: Dict[Any, List] = defaultdict(list)
+        buffered = 0
+        for value, element in keyed:
+            buffer = buffers[value]
+            buffer.append(element)
+            buffered += 1
+            if len(buffer) >= chunk_size:
+                buffered -= len(buffer)
+                yield value, buffers.pop(value)
+            elif buffered >= buffer_limit:
+                yield from buffers.items()
+                buffers, buffered = defaultdict(list), 0
+        yield from buffers.items()
+
+    def _run_by_partition(self, keyed: Iterable[Tuple[Any, Any]], operation: str, to_batch_arguments: Callable,
+                          single: Callable, result: BulkResult, max_concurrency: int, use_batches: bool,
+                          max_retries: int, bar: tqdm):
+        """
+        Runs `operation` on the (partition value, element) pairs of `keyed`, consumed as a stream: at most twice
+        `max_concurrency` chunks are submitted and not done at any time.
+        """
+        chunk_size = TRANSACTIONAL_BATCH_LIMIT if use_batches else 1
+        pending: Set[Future] = set()
+
+        def drain(return_when: str):
+            nonlocal pending
+            done, pending = wait(pending, return_when=return_when)
+            for future in done:
+                bar.update(future.result())
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+            for value, chunk in self._chunks(keyed, chunk_size):
+                if len(pending) >= 2 * max_concurrency:
+                    drain(FIRST_COMPLETED)
+                pending.add(pool.submit(self._run_chunk, value, chunk, operation, to_batch_arguments, single, result,
+                                        use_batches, max_retries))
+            drain(ALL_COMPLETED)
+
+    def bulk_upsert(self, items: Iterable[MutableMapping], id_key: Optional[str] = None,
+                    max_concurrency: int = DEFAULT_CONCURRENCY, use_batches: bool = True,
+                    max_retries: int = DEFAULT_MAX_RETRIES, with_progress_bar: bool = True) -> BulkResult:
+        """
+        Upserts `items` with at most `max_concurrency` requests in flight. Items are grouped by partition key value
+        into transactional batches (when `use_batches` is set), and throttled requests are retried after the delay
+        given by the `x-ms-retry-after-ms` header, at most `max_retries` times. `items` may be an iterator, it is
+        consumed as the requests are sent.
+        """
+        total = len(items) if isinstance(items, Sized) else None
+        logging.info(f"Upserting {total if total is not None else 'a stream of'} items")
+        result = BulkResult()
+        start = time.perf_counter()
+
+        def keyed() -> Iterator[Tuple[Any, MutableMapping]]:
+            for item in items:
                 if id_key is not None:
                     item["id"] = item[id_key]
-                try:
-                    self._container.upsert_item(item)
-                except CosmosHttpResponseError:
-                    errors.append(item)
+                yield self._partition_value(item), item
 
-                if with_progress_bar:
-                    bar.update(1)
-                    bar.set_postfix({"time": datetime.datetime.utcnow()})
+        with tqdm(total=total, desc="Upserting elements", unit_scale=True, disable=not with_progress_bar) as bar:
+            self._run_by_partition(keyed(), "upsert", lambda item: (item,),
+                                   lambda item, _, hook: self._container.upsert_item(item, response_hook=hook),
+                                   result, max_concurrency, use_batches, max_retries, bar)
 
-        if len(errors) > 0:
-            logging.warning(f"{len(errors)} requests were in error. Retrying ...")
-            time.sleep(1)
-            self.upsert_all(errors, id_key)
+        result.elapsed = time.perf_counter() - start
+        logging.info(f"Upserted {result.succeeded} items ({result.failed} errors) in {result.elapsed:.1f}s, "
+                     f"{result.request_charge:.0f} RU ({result.throughput:.0f} items/s, "
+                     f"{result.request_units_per_second:.0f} RU/s)")
+        return result
 
-    def upsert_each(self, items: Iterator[MutableMapping], id_key: Optional[str] = None):
-        logging.info("Upserting items ...")
-        total = 0
-        errors = []
-        for item in items:
-            if id_key is not None:
-                item["id"] = item[id_key]
-            try:
-                self._container.upsert_item(item)
-            except CosmosHttpResponseError:
-                errors.append(item)
-            total += 1
-        logging.info(f"Upserted {total} items. ({len(errors)} errors)")
-        if len(errors) > 0:
-            logging.warning(f"{len(errors)} requests were in error. Retrying ...")
-            time.sleep(1)
-            self.upsert_all(errors, id_key)
+    def purge(self, condition: Optional[str] = None, parameters: Optional[List[Dict]] = None,
+              max_concurrency: int = DEFAULT_CONCURRENCY, use_batches: bool = True,
+              max_retries: int = DEFAULT_MAX_RETRIES, page_size: int = 1000) -> BulkResult:
+        """
+        Deletes the items matching `condition` (a WHERE clause on `c`). Only ids and partition key values are
+        projected and paged with continuation tokens, then deleted by partition like bulk_upsert.
+        """
+        result = BulkResult()
+        start = time.perf_counter()
+        partition_path = "c" + "".join(f'["{k}"]' for k in self._partition_key.strip("/").split("/"))
+        query = f"SELECT c.id, {partition_path} AS pk FROM c" + (f" WHERE {condition}" if condition else "")
+        logging.info(f"Purging items with query: {query}")
+
+        pages = self._container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True,
+                                            max_item_count=page_size, response_hook=result.charge).by_page()
+        with tqdm(desc="Deleting elements", unit_scale=True) as bar:
+            self._run_by_partition(((item.get("pk"), item["id"]) for page in pages for item in page), "delete",
+                                   lambda item_id: (item_id,),
+                                   lambda item_id, pk, hook: self._container.delete_item(
+                                       item_id, partition_key=pk, response_hook=hook),
+                                   result, max_concurrency, use_batches, max_retries, bar)
+
+        result.elapsed = time.perf_counter() - start
+        logging.info(f"Deleted {result.succeeded} items ({result.failed} errors) in {result.elapsed:.1f}s, "
+                     f"{result.request_charge:.0f} RU ({result.throughput:.0f} items/s)")
+        return result
 
     def remove(self, item: Mapping):
-        self._container.delete_item(item, partition_key=self._partition_key)
-
-    def remove_by_query(self, query: str) -> int:
-        total = 0
-        for item in self._container.query_items(query=query, enable_cross_partition_query=True):
-            self.remove(item)
-            total += 1
-        return total
+        self._container.delete_item(item, partition_key=self._partition_value(item))
+
+    def remove_by_query(self, condition: Optional[str] = None, parameters: Optional[List[Dict]] = None) -> int:
+        return self.purge(condition, parameters).succeeded
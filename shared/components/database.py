@@ -1,16 +1,24 @@
 import logging
+from collections import defaultdict
 from enum import Enum
-from typing import Callable, List, Dict
+from typing import Callable, List, Dict, Any, Iterable, Set, Tuple, Optional
 
-from sqlalchemy import create_engine, URL, Engine, select, Column
-from sqlalchemy.orm import Session
+from sqlalchemy import create_engine, URL, Engine, select, Column, Table, text, inspect, MetaData, insert, literal
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, MANYTOONE
 
-from ..utils import wrap_around_progress_bar, get
+from ..utils import get
+
+BULK_BATCH_SIZE = 1000
+MSSQL_MAX_PARAMETERS = 2000
+IN_CLAUSE_CHUNK_SIZE = 1000
+TEMP_TABLE_THRESHOLD = 50000
 
 
 class SQLEngine(Enum):
     MSSQL = "mssql+pymssql"
     POSTGRES = "postgresql+psycopg2"
+    SQLITE = "sqlite"
 
     @staticmethod
     def from_string(value: str):
@@ -19,18 +27,22 @@ class SQLEngine(Enum):
                 return SQLEngine.MSSQL
             case "postgres":
                 return SQLEngine.POSTGRES
+            case "sqlite":
+                return SQLEngine.SQLITE
             case _:
                 raise ValueError(f"Unknown SQL engine: {value}")
 
 
 class Database:
     _engine: Engine
+    _sql_engine: SQLEngine
 
     @classmethod
     def init_with_credentials(cls, engine: str, username: str, password: str, host: str, port: int,
                               database: str):
+        cls._sql_engine = SQLEngine.from_string(engine)
         cls._engine = create_engine(
-            URL.create(drivername=SQLEngine.from_string(engine).value, username=username, password=password, host=host, port=port,
+            URL.create(drivername=cls._sql_engine.value, username=username, password=password, host=host, port=port,
                        database=database))
 
     @classmethod
@@ -48,31 +60,218 @@ class Database:
     def get_session(cls) -> Session:
         return Session(cls._engine)
 
+    @classmethod
+    def sql_engine(cls) -> SQLEngine:
+        return cls._sql_engine
+
+
+def _related_key(target: Any, column: Column) -> Any:
+    state = inspect(target)
+    if state.identity is not None:
+        return state.identity[state.mapper.primary_key.index(column)]
+    return getattr(target, state.mapper.get_property_by_column(column).key)
+
+
+def _to_row(entity: Any, table: Table) -> Dict:
+    mapper = inspect(entity).mapper
+    row = {c.name: getattr(entity, mapper.get_property_by_column(c).key) for c in table.columns}
+    for relationship in mapper.relationships:
+        if relationship.direction is not MANYTOONE:
+            continue
+        target = getattr(entity, relationship.key)
+        if target is not None:
+            for local, remote in relationship.local_remote_pairs:
+                row[local.name] = _related_key(target, remote)
+    return row
+
+
+def _on_conflict_upsert(session: Session, table: Table, rows: List[Dict], batch_size: int, dialect_insert: Callable):
+    statement = dialect_insert(table)
+    keys = [c.name for c in table.primary_key.columns]
+    statement = statement.on_conflict_do_update(
+        index_elements=keys, set_={c.name: statement.excluded[c.name] for c in table.columns if c.name not in keys})
+    for i in range(0, len(rows), batch_size):
+        session.execute(statement, rows[i:i + batch_size])
+
+
+def _mssql_upsert(session: Session, table: Table, rows: List[Dict], batch_size: int):
+    columns = [c.name for c in table.columns]
+    keys = [c.name for c in table.primary_key.columns]
+    batch_size = max(1, min(batch_size, MSSQL_MAX_PARAMETERS // len(columns)))
+
+    def merge_statement(n: int):
+        values = ", ".join(f"({', '.join(f':{c}_{i}' for c in columns)})" for i in range(n))
+        return text(
+            f"MERGE INTO {table.name} WITH (HOLDLOCK) AS target "
+            f"USING (VALUES {values}) AS source ({', '.join(columns)}) "
+            f"ON {' AND '.join(f'target.{k} = source.{k}' for k in keys)} "
+            f"WHEN MATCHED THEN UPDATE SET {', '.join(f'target.{c} = source.{c}' for c in columns if c not in keys)} "
+            f"WHEN NOT MATCHED THEN INSERT ({', '.join(columns)}) VALUES ({', '.join(f'source.{c}' for c in columns)});")
+
+    for i in range(0, len(rows), batch_size):
+        batch = rows[i:i + batch_size]
+        session.execute(merge_statement(len(batch)),
+                        {f"{c}_{j}": row[c] for j, row in enumerate(batch) for c in columns})
+
+
+def bulk_upsert(session: Session, table: Table, rows: List[Dict], batch_size: int = BULK_BATCH_SIZE):
+    """
+    Set-based upsert of `rows` into `table`, sent in batches of `batch_size` rows:
+    INSERT ... ON CONFLICT DO UPDATE on Postgres and SQLite, MERGE on MSSQL. Rows sharing a key are collapsed, last one
+    wins.
+    """
+    keys = [c.name for c in table.primary_key.columns]
+    rows = list({tuple(row[k] for k in keys): row for row in rows}.values())
+    match Database.sql_engine():
+        case SQLEngine.POSTGRES:
+            _on_conflict_upsert(session, table, rows, batch_size, postgresql.insert)
+        case SQLEngine.SQLITE:
+            _on_conflict_upsert(session, table, rows, batch_size, sqlite.insert)
+        case SQLEngine.MSSQL:
+            _mssql_upsert(session, table, rows, batch_size)
+
 
 @Database.with_session
-def insert_or_update(entities: List, entity_id_column: Column, session: Session):
-    already_existing = {a[0]: "" for a in session.execute(select(entity_id_column)).all()}
-    to_merge = []
-    to_add = []
-    for entity in entities:
-        if entity.__dict__.get(entity_id_column.key) in already_existing:
-            to_merge.append(entity)
-        else:
-            to_add.append(entity)
+def insert_or_update(entities: List, entity_id_column: Column, session: Session,
+                     batch_size: int = BULK_BATCH_SIZE, write: Callable = bulk_upsert) -> int:
+    table = entity_id_column.table
+    keys = [c.key for c in table.primary_key.columns]
+    keyed = [e for e in entities if all(getattr(e, k) is not None for k in keys)]
+    generated = [e for e in entities if any(getattr(e, k) is None for k in keys)]
 
-    logging.info(f"{len(to_add)} entities to add and {len(to_merge)} to merge.")
-    if len(to_add) > 0:
-        logging.info("Adding non existing entities ...")
-        session.add_all(to_add)
+    if len(generated) > 0:
+        logging.info(f"Adding {len(generated)} entities with generated keys ...")
+        session.add_all(generated)
         session.flush()
 
-    if len(to_merge) > 0:
-        logging.info("Merging already existing entities")
-        with session.no_autoflush:
-            wrap_around_progress_bar(lambda x: session.merge(x), to_merge, "Merging entities")
+    if len(keyed) > 0:
+        logging.info(f"Upserting {len(keyed)} entities by batches of {batch_size} ...")
+        write(session, table, [_to_row(e, table) for e in keyed], batch_size)
+
+    return len(entities)
+
+
+def _existing_keys_with_temp_table(session: Session, column: Column, keys: List) -> Set:
+    is_mssql = Database.sql_engine() == SQLEngine.MSSQL
+    incoming = Table("#incoming_keys" if is_mssql else "incoming_keys", MetaData(), Column("key", column.type),
+                     prefixes=[] if is_mssql else ["TEMPORARY"])
+    incoming.create(session.connection())
+    try:
+        for i in range(0, len(keys), BULK_BATCH_SIZE):
+            session.execute(insert(incoming), [{"key": k} for k in keys[i:i + BULK_BATCH_SIZE]])
+        joined = column.table.join(incoming, incoming.c.key == column)
+        return {r[0] for r in session.execute(select(column).select_from(joined).distinct())}
+    finally:
+        incoming.drop(session.connection())
+
+
+def existing_keys(session: Session, column: Column, keys: Iterable, chunk_size: int = IN_CLAUSE_CHUNK_SIZE,
+                  temp_table_threshold: int = TEMP_TABLE_THRESHOLD) -> Set:
+    """
+    Returns the subset of `keys` already present in `column`. Only the incoming keys are looked up, with chunked
+    IN (...) lists, or by joining a temporary table when there are more than `temp_table_threshold` keys. A None key
+    is looked up with IS NULL, as IN (...) never matches NULL.
+    """
+    incoming = set(keys)
+    existing: Set = set()
+    if None in incoming:
+        incoming.discard(None)
+        null_key = select(literal(1)).select_from(column.table).where(column.is_(None)).limit(1)
+        if session.execute(null_key).first() is not None:
+            existing.add(None)
+    looked_up = list(incoming)
+    if len(looked_up) > temp_table_threshold:
+        return existing | _existing_keys_with_temp_table(session, column, looked_up)
+
+    for i in range(0, len(looked_up), chunk_size):
+        existing.update(r[0] for r in session.execute(select(column).where(column.in_(looked_up[i:i + chunk_size]))))
+    return existing
+
+
+def depth_levels(rows: List[Dict], id_key: str, parent_key: str) -> Tuple[List[List[Dict]], List[Dict]]:
+    """
+    Groups the rows of a self-referencing table by depth, so that each level only references rows of the previous
+    levels or rows outside `rows`. Rows whose parent chain loops are returned apart.
+    """
+    by_id = {r[id_key]: r for r in rows}
+    children: Dict[Any, List[Dict]] = defaultdict(list)
+    level = []
+    for r in rows:
+        if r.get(parent_key) is not None and r[parent_key] in by_id:
+            children[r[parent_key]].append(r)
+        else:
+            level.append(r)
+
+    levels = []
+    while len(level) > 0:
+        levels.append(level)
+        level = [c for r in level for c in children[r[id_key]]]
+    placed = {id(r) for level in levels for r in level}
+    return levels, [r for r in rows if id(r) not in placed]
+
+
+@Database.with_session
+def upsert_levels(levels: List[List[Dict]], table: Table, session: Session, batch_size: int = BULK_BATCH_SIZE,
+                  write: Callable = bulk_upsert) -> int:
+    """Upserts the levels returned by depth_levels in order, in a single transaction."""
+    for depth, level in enumerate(levels):
+        logging.info(f"Upserting {len(level)} rows at depth {depth} ...")
+        write(session, table, level, batch_size)
+    return sum(len(level) for level in levels)
+
+
+@Database.with_session
+def upsert_rows(rows: List[Dict], table: Table, session: Session, batch_size: int = BULK_BATCH_SIZE) -> int:
+    logging.info(f"Upserting {len(rows)} rows by batches of {batch_size} ...")
+    bulk_upsert(session, table, rows, batch_size)
+    return len(rows)
+
+
+def stored_fingerprints(session: Session, id_column: Column, fingerprint_column: Column, keys: Iterable,
+                        chunk_size: int = IN_CLAUSE_CHUNK_SIZE) -> Dict:
+    keys = list({k for k in keys if k is not None})
+    fingerprints: Dict[Any, Optional[str]] = {}
+    for i in range(0, len(keys), chunk_size):
+        query = select(id_column, fingerprint_column).where(id_column.in_(keys[i:i + chunk_size]))
+        fingerprints.update((r[0], r[1]) for r in session.execute(query))
+    return fingerprints
+
+
+@Database.with_session
+def ensure_columns(columns: Iterable[Column], session: Session):
+    """
+    Adds the `columns` missing from their existing table, with their type and nullable, as the jobs do not create the
+    schema. Nothing is written when they all exist, so it runs at the start of every job.
+    """
+    connection = session.connection()
+    inspector = inspect(connection)
+    preparer = connection.dialect.identifier_preparer
+    for column in columns:
+        table = column.table
+        if column.name in {c["name"] for c in inspector.get_columns(table.name)}:
+            continue
+        logging.info(f"Adding the {column.name} column to {table.name} ...")
+        session.execute(text(f"ALTER TABLE {preparer.format_table(table)} ADD {preparer.format_column(column)} "
+                             f"{column.type.compile(dialect=connection.dialect)}"))
+
+
+def _field(entity: Any, key: str) -> Any:
+    return entity[key] if isinstance(entity, dict) else getattr(entity, key)
+
+
+def keep_changed(session: Session, entities: List, id_column: Column) -> List:
+    """Keeps the new entities (or rows) and the ones whose fingerprint differs from the stored one."""
+    stored = stored_fingerprints(session, id_column, id_column.table.c.fingerprint,
+                                 (_field(e, id_column.key) for e in entities))
+    return [e for e in entities if stored.get(_field(e, id_column.key)) != _field(e, "fingerprint")]
+
+
+@Database.with_session
+def drop_unchanged_entities(entities: List, id_column: Column, session: Session) -> List:
+    return keep_changed(session, entities, id_column)
 
 
 @Database.with_session
 def drop_data_json_entry(data: List[Dict], unique_column: Column, *data_path, session: Session) -> List[Dict]:
-    already_existing = {a[0]: "" for a in session.execute(select(unique_column)).all()}
+    already_existing = existing_keys(session, unique_column, (get(d, *data_path) for d in data))
     return [d for d in data if get(d, *data_path) not in already_existing]
@@ -0,0 +1,105 @@
+import io
+import logging
+from typing import List, Dict, Any
+
+import pandas
+from sqlalchemy import Table, select, literal, text
+from sqlalchemy.orm import Session
+
+from .database import Database, SQLEngine, bulk_upsert, BULK_BATCH_SIZE
+
+NULL_MARKER = "\\N"
+
+
+def to_frame(rows: List[Dict], table: Table) -> pandas.DataFrame:
+    """
+    Columnar batch of `rows` with the columns of `table`, in order. Columns are kept as Python objects so that nullable
+    integers are not turned into floats. Rows sharing a key are collapsed, last one wins.
+    """
+    columns = [c.name for c in table.columns]
+    frame = pandas.DataFrame({c: pandas.Series([r.get(c) for r in rows], dtype=object) for c in columns})
+    return frame.drop_duplicates(subset=[c.name for c in table.primary_key.columns], keep="last")
+
+
+def _quoted(session: Session, *names: str) -> List[str]:
+    preparer = session.get_bind().dialect.identifier_preparer
+    return [preparer.quote(n) for n in names]
+
+
+def _driver_connection(session: Session) -> Any:
+    """DB-API connection of the driver under the session, for its bulk copy API."""
+    connection = session.connection().connection.driver_connection
+    if connection is None:
+        raise ValueError("The session has no open driver connection")
+    return connection
+
+
+def _postgres_load(session: Session, table: Table, frame: pandas.DataFrame):
+    staging = f"staging_{table.name}"
+    columns = _quoted(session, *frame.columns)
+    keys = _quoted(session, *(c.name for c in table.primary_key.columns))
+    session.execute(text(f"CREATE TEMPORARY TABLE {staging} (LIKE {_quoted(session, table.name)[0]})"))
+
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, header=False, na_rep=NULL_MARKER)
+    buffer.seek(0)
+    cursor = _driver_connection(session).cursor()
+    try:
+        cursor.copy_expert(f"COPY {staging} ({', '.join(columns)}) FROM STDIN "
+                           f"WITH (FORMAT csv, NULL '{NULL_MARKER}')", buffer)
+    finally:
+        cursor.close()
+
+    session.execute(text(
+        f"INSERT INTO {_quoted(session, table.name)[0]} ({', '.join(columns)}) "
+        f"SELECT {', '.join(columns)} FROM {staging} "
+        f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET "
+        f"{', '.join(f'{c} = EXCLUDED.{c}' for c in columns if c not in keys)}"))
+    session.execute(text(f"DROP TABLE {staging}"))
+
+
+def _mssql_load(session: Session, table: Table, frame: pandas.DataFrame, batch_size: int):
+    staging = f"#staging_{table.name}"
+    columns = list(frame.columns)
+    keys = [c.name for c in table.primary_key.columns]
+    session.execute(text(f"SELECT TOP 0 {', '.join(columns)} INTO {staging} FROM {table.name}"))
+
+    _driver_connection(session).bulk_copy(
+        staging, frame.itertuples(index=False, name=None), batch_size=batch_size)
+
+    session.execute(text(
+        f"MERGE INTO {table.name} WITH (HOLDLOCK) AS target USING {staging} AS source "
+        f"ON {' AND '.join(f'target.{k} = source.{k}' for k in keys)} "
+        f"WHEN MATCHED THEN UPDATE SET {', '.join(f'target.{c} = source.{c}' for c in columns if c not in keys)} "
+        f"WHEN NOT MATCHED THEN INSERT ({', '.join(columns)}) VALUES ({', '.join(f'source.{c}' for c in columns)});"))
+    session.execute(text(f"DROP TABLE {staging}"))
+
+
+def bulk_load(session: Session, table: Table, rows: List[Dict], batch_size: int = BULK_BATCH_SIZE):
+    """
+    Full load path of `rows` into `table`: the rows are turned into a columnar batch, streamed into a staging table
+    (COPY FROM STDIN on Postgres, bulk copy on MSSQL), then merged into `table` with a single set-based statement.
+    Other engines fall back to bulk_upsert. Same signature as bulk_upsert, so the two can be swapped.
+    """
+    if len(rows) <= 0:
+        return
+    frame = to_frame(rows, table)
+    match Database.sql_engine():
+        case SQLEngine.POSTGRES:
+            _postgres_load(session, table, frame)
+        case SQLEngine.MSSQL:
+            _mssql_load(session, table, frame, batch_size)
+        case _:
+            bulk_upsert(session, table, rows, batch_size)
+
+
+@Database.with_session
+def bulk_load_rows(rows: List[Dict], table: Table, session: Session, batch_size: int = BULK_BATCH_SIZE) -> int:
+    logging.info(f"Bulk loading {len(rows)} rows into {table.name} ...")
+    bulk_load(session, table, rows, batch_size)
+    return len(rows)
+
+
+@Database.with_session
+def is_empty(table: Table, session: Session) -> bool:
+    return session.execute(select(literal(1)).select_from(table).limit(1)).first() is None
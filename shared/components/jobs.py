@@ -1,13 +1,131 @@
+import logging
+import threading
 import uuid
-from typing import Optional, Dict
+from contextlib import contextmanager
+from typing import Optional, Dict, Iterator, Iterable, Callable
 
+from azure.core import MatchConditions
 from azure.core.credentials import AzureNamedKeyCredential
-from azure.core.exceptions import ResourceNotFoundError
+from azure.core.exceptions import ResourceNotFoundError, ResourceExistsError, ResourceModifiedError, AzureError
 from azure.data.tables import TableServiceClient, TableClient, UpdateMode
 
-from shared.utils import now_with_tz, TIMEZONE
+from shared.utils import now_with_tz, TIMEZONE, METRICS_PREFIX
 import datetime
 
+LEASE_ROW_KEY = "lease"
+LEASE_DURATION = datetime.timedelta(minutes=2)
+LEASE_RETRY_DELAY = datetime.timedelta(seconds=5)
+CHECKPOINT_ROW_KEY = "checkpoint"
+
+
+class LeaseLostError(Exception):
+    def __init__(self, partition_key: str):
+        super().__init__(f"Lease on {partition_key} was lost, another run may have started")
+        self.partition_key = partition_key
+
+
+class Lease:
+    """
+    Mutual exclusion between runs of a job, held through an entity updated only when its ETag did not change. The
+    lease expires `duration` after its last renewal, so a crashed holder releases it. While held, a heartbeat thread
+    renews it every third of `duration`, retrying transient errors until the lease expires. Once it could not be
+    renewed, `lost` is set and the job should stop (see ensure_held).
+    """
+    owner: str
+    lost: bool
+
+    def __init__(self, table_client: TableClient, partition_key: str, duration: datetime.timedelta = LEASE_DURATION):
+        self._table_client = table_client
+        self._partition_key = partition_key
+        self._duration = duration
+        self._etag: Optional[str] = None
+        self._expires_at: Optional[datetime.datetime] = None
+        self._stopped = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+        self.owner = str(uuid.uuid4())
+        self.lost = False
+
+    def _entity(self) -> Dict:
+        return {"PartitionKey": self._partition_key, "RowKey": LEASE_ROW_KEY, "owner": self.owner,
+                "expires_at": now_with_tz() + self._duration}
+
+    def _write(self, operation: Callable[..., Dict], entity: Dict, **kwargs) -> str:
+        etag = operation(entity, **kwargs)["etag"]
+        self._expires_at = entity["expires_at"]
+        return etag
+
+    def acquire(self) -> bool:
+        try:
+            current = self._table_client.get_entity(partition_key=self._partition_key, row_key=LEASE_ROW_KEY)
+        except ResourceNotFoundError:
+            try:
+                self._etag = self._write(self._table_client.create_entity, self._entity())
+                return True
+            except ResourceExistsError:
+                return False
+
+        # A lease without expiry date is treated as expired
+        expires_at = current.get("expires_at")
+        if current.get("owner") != self.owner and expires_at is not None and expires_at > now_with_tz():
+            logging.info(f"Lease on {self._partition_key} is held by {current.get('owner')} until "
+                         f"{current.get('expires_at')}")
+            return False
+        self._etag = current.metadata["etag"]
+        return self.renew()
+
+    def renew(self) -> bool:
+        try:
+            self._etag = self._write(self._table_client.update_entity, self._entity(), mode=UpdateMode.REPLACE,
+                                     etag=self._etag, match_condition=MatchConditions.IfNotModified)
+            return True
+        except (ResourceModifiedError, ResourceNotFoundError):
+            return False
+
+    def _renew_before_expiry(self) -> bool:
+        while True:
+            try:
+                return self.renew()
+            except AzureError as e:
+                if self._expires_at is None or now_with_tz() + LEASE_RETRY_DELAY >= self._expires_at:
+                    logging.error(f"Could not renew the lease on {self._partition_key} before it expires: {e!r}")
+                    return False
+                logging.warning(f"Renewing the lease on {self._partition_key} failed, retrying: {e!r}")
+                if self._stopped.wait(LEASE_RETRY_DELAY.total_seconds()):
+                    return True
+
+    def _beat(self):
+        while not self._stopped.wait(self._duration.total_seconds() / 3):
+            try:
+                renewed = self._renew_before_expiry()
+            except Exception as e:
+                logging.exception(f"Unexpected error while renewing the lease on {self._partition_key}: {e!r}")
+                renewed = False
+            if not renewed:
+                logging.error(f"Lease on {self._partition_key} was lost")
+                self.lost = True
+                return
+
+    def ensure_held(self):
+        """Raises LeaseLostError once the lease was lost, so that the job stops before another run overlaps it."""
+        if self.lost:
+            raise LeaseLostError(self._partition_key)
+
+    def start_heartbeat(self):
+        self._heartbeat = threading.Thread(target=self._beat, name=f"lease-{self._partition_key}", daemon=True)
+        self._heartbeat.start()
+
+    def release(self):
+        self._stopped.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+        if self.lost:
+            return
+        try:
+            self._table_client.delete_entity(partition_key=self._partition_key, row_key=LEASE_ROW_KEY,
+                                             etag=self._etag, match_condition=MatchConditions.IfNotModified)
+        except (ResourceModifiedError, ResourceNotFoundError):
+            pass
+
 
 class JobsTable:
     _service: TableServiceClient
@@ -19,13 +137,14 @@ class JobsTable:
         self._service = TableServiceClient(endpoint=uri, credential=credential)
         self._table_client = self._service.get_table_client(table_name=table_name)
 
-    def get(self, partition_key: str, row_key: str) -> Optional[Dict]:
+    def get(self, partition_key: str, row_key: str) -> Dict:
+        """The entity, or an empty dict when there is none."""
         try:
             return self._table_client.get_entity(partition_key=partition_key, row_key=row_key)
         except ResourceNotFoundError:
             return {}
 
-    def get_last_run(self, partition_key: str) -> Optional[Dict]:
+    def get_last_run(self, partition_key: str) -> Dict:
         result = self.get(partition_key, "last")
         return {
             "PartitionKey": partition_key,
@@ -33,7 +152,7 @@ class JobsTable:
             "run_datetime": datetime.datetime.fromtimestamp(0).astimezone(tz=TIMEZONE)
         } if len(result) <= 0 else result
 
-    def update_last_run(self, partition_key: str, **updates):
+    def update_last_run(self, partition_key: str, metrics: Optional[Dict] = None, **updates):
         last_run = self.get_last_run(partition_key)
         if last_run is not None:
             self.create(last_run, row_key=str(uuid.uuid4()))
@@ -46,8 +165,51 @@ class JobsTable:
 
         if len(updates) > 0:
             last_run.update(updates)
+        if metrics is not None:
+            last_run = {k: v for k, v in last_run.items() if not k.startswith(METRICS_PREFIX)}
+            last_run.update(metrics)
         self.replace(last_run)
 
+    @contextmanager
+    def lease(self, partition_key: str, duration: datetime.timedelta = LEASE_DURATION) -> Iterator[Optional[Lease]]:
+        """Yields the held lease of the job, or None right away when another run holds it."""
+        lease = Lease(self._table_client, partition_key, duration)
+        if not lease.acquire():
+            yield None
+            return
+        lease.start_heartbeat()
+        try:
+            yield lease
+        finally:
+            lease.release()
+
+    def get_checkpoint(self, partition_key: str, archive_sha256: str) -> Dict:
+        """
+        Progress of the interrupted run of the job on the archive `archive_sha256`, or an empty dict when there is none
+        (or when it was made on another archive). `completed_tasks` is returned as a list.
+        """
+        checkpoint = self.get(partition_key, CHECKPOINT_ROW_KEY)
+        if checkpoint.get("archive_sha256") != archive_sha256:
+            return {}
+        completed = checkpoint.get("completed_tasks") or ""
+        return {**checkpoint, "completed_tasks": [t for t in completed.split(",") if len(t) > 0]}
+
+    def save_checkpoint(self, partition_key: str, archive_sha256: str, stage: str, batch_offset: int = 0,
+                        completed_tasks: Iterable[str] = ()):
+        self.replace({
+            "PartitionKey": partition_key,
+            "RowKey": CHECKPOINT_ROW_KEY,
+            "archive_sha256": archive_sha256,
+            "stage": stage,
+            "batch_offset": batch_offset,
+            # Table entities cannot hold lists
+            "completed_tasks": ",".join(completed_tasks),
+            "updated_at": now_with_tz()
+        })
+
+    def clear_checkpoint(self, partition_key: str):
+        self._table_client.delete_entity(partition_key=partition_key, row_key=CHECKPOINT_ROW_KEY)
+
     def query(self, partition_key: str, row_key: Optional[str] = None, **filters) -> Dict:
         row_key_eq = f"RowKey eq '{row_key}'" if row_key is not None else ""
         filters_query = ' and '.join([f"{k} eq '{v}'" for k, v in filters.items()])
@@ -0,0 +1,86 @@
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from shared.utils import fingerprint
+
+
+@dataclass(frozen=True)
+class Field:
+    """
+    A mapped value: read from one or more paths in the export (missing or null values become `default`), then passed
+    to `converter`. Required paths are indexed directly, like data["uid"], and raise KeyError when missing.
+    """
+    name: str
+    paths: Tuple[Tuple[str, ...], ...]
+    converter: Optional[Callable] = None
+    default: Any = None
+    required: bool = False
+
+    @classmethod
+    def of(cls, name: str, *paths: Tuple[str, ...], converter: Optional[Callable] = None, default: Any = None,
+           required: bool = False) -> "Field":
+        return cls(name, paths, converter, default, required)
+
+
+class FieldSpec:
+    """
+    Declarative mapping of an export entry to a model. Fields are compiled at import time into a single extractor
+    function which walks each shared path prefix once. `extras` are only used in the fingerprint.
+    """
+    fields: List[Field]
+    extras: List[Field]
+    columns: List[str]
+
+    def __init__(self, fields: Sequence[Field], extras: Sequence[Field] = ()):
+        self.fields = list(fields)
+        self.extras = list(extras)
+        self.columns = [f.name for f in self.fields] + ["fingerprint"]
+        self._extract = self._compile(self.fields + self.extras)
+
+    @staticmethod
+    def _compile(fields: List[Field]) -> Callable[[Dict], Tuple]:
+        lines = ["def extract(data):"]
+        namespace: Dict[str, Any] = {}
+        nodes: Dict[Tuple[str, ...], str] = {(): "data"}
+
+        def node(prefix: Tuple[str, ...]) -> str:
+            if prefix not in nodes:
+                parent = node(prefix[:-1])
+                name = f"n{len(nodes)}"
+                guard = f" if {parent} is not None else None" if parent != "data" else ""
+                lines.append(f"    {name} = {parent}.get({prefix[-1]!r}){guard}")
+                lines.append(f"    if {name}.__class__ is not dict: {name} = None")
+                nodes[prefix] = name
+            return nodes[prefix]
+
+        for i, field in enumerate(fields):
+            arguments = []
+            for j, path in enumerate(field.paths):
+                if field.required:
+                    arguments.append("data" + "".join(f"[{k!r}]" for k in path))
+                    continue
+                parent, name = node(path[:-1]), f"v{i}_{j}"
+                guard = f" if {parent} is not None else None" if parent != "data" else ""
+                lines.append(f"    {name} = {parent}.get({path[-1]!r}){guard}")
+                if field.default is not None:
+                    namespace[f"d{i}"] = field.default
+                    lines.append(f"    if {name} is None: {name} = d{i}")
+                arguments.append(name)
+            if field.converter is not None:
+                namespace[f"c{i}"] = field.converter
+                lines.append(f"    f{i} = c{i}({', '.join(arguments)})")
+            else:
+                lines.append(f"    f{i} = {arguments[0]}")
+        lines.append(f"    return ({''.join(f'f{i}, ' for i in range(len(fields)))})")
+
+        exec(compile("\n".join(lines), "<field-spec>", "exec"), namespace)
+        return namespace["extract"]
+
+    def to_dict(self, data: Dict) -> Dict:
+        values = self._extract(data)
+        row = dict(zip(self.columns, values[:len(self.fields)]))
+        row["fingerprint"] = fingerprint(row, *values[len(self.fields):])
+        return row
+
+    def to_entity(self, model: type, data: Dict) -> Any:
+        return model(**self.to_dict(data))
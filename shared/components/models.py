@@ -1,14 +1,48 @@
+from functools import partial
 from typing import Dict, List, Optional
 
 from sqlalchemy import Column, String, DateTime, Boolean, Date, Integer, ForeignKey
 from sqlalchemy.orm import declarative_base, Mapped, relationship, mapped_column
 
-from shared.utils import convert_to_datetime, get, to_int, decode_html_french_string
+from shared.utils import convert_to_datetime, to_int, decode_html_french_string
+from .mapping import Field, FieldSpec
 
 Base = declarative_base()
 
+to_datetime = partial(convert_to_datetime, date_format="%Y-%m-%d")
+to_date = partial(convert_to_datetime, date_format="%Y-%m-%d", as_date=True)
 
-class Amendments(Base):
+
+def non_empty(value: Optional[str]) -> Optional[str]:
+    return value if value is not None and len(value) > 0 else None
+
+
+def lower(value: Optional[str]) -> Optional[str]:
+    return value.lower() if value is not None else None
+
+
+def is_true(value: str) -> bool:
+    return value.lower() == "true"
+
+
+def join_non_null(*values: Optional[str]) -> Optional[str]:
+    joined = ','.join([v for v in values if v is not None])
+    return joined if len(joined) > 0 else None
+
+
+def electronic_address(value: Optional[str], address_type: Optional[str]) -> Optional[str]:
+    return value if address_type in ["22", "15"] else None
+
+
+def phone_number(value: Optional[str], address_type: Optional[str]) -> Optional[str]:
+    return value if address_type == "11" else None
+
+
+class Fingerprinted:
+    fingerprint = Column(String(32))
+
+
+class Amendments(Fingerprinted, Base):
     __tablename__ = "amendments"
 
     uid = Column(String, primary_key=True)
@@ -29,27 +63,30 @@ class Amendments(Base):
     contentTitle = Column(String)
     contentSummary = Column(String)
 
+    export_spec = FieldSpec([
+        Field.of("uid", ("uid",), required=True),
+        Field.of("examination_ref", ("examenRef",), required=True),
+        Field.of("tri_amendment", ("triAmendement",), converter=non_empty),
+        Field.of("legislative_text_ref", ("texteLegislatifRef",), required=True),
+        Field.of("delivery_date", ("cycleDeVie", "dateDepot"), converter=to_datetime),
+        Field.of("publication_date", ("cycleDeVie", "datePublication"), converter=to_datetime),
+        Field.of("sort_date", ("cycleDeVie", "dateSort"), converter=convert_to_datetime),
+        Field.of("state", ("cycleDeVie", "etatDesTraitements", "etat", "libelle")),
+        Field.of("sub_state", ("cycleDeVie", "etatDesTraitements", "sousEtat", "libelle")),
+        Field.of("representation", ("representations", "representation", "contenu", "documentURI")),
+        Field.of("article99", ("article99",), converter=is_true, required=True),
+        Field.of("contentTitle", ("corps", "contenuAuteur", "dispositif"), converter=decode_html_french_string,
+                 default=""),
+        Field.of("contentSummary", ("corps", "contenuAuteur", "exposeSommaire"), converter=decode_html_french_string,
+                 default="")
+    ])
+
     @classmethod
     def from_data_export(cls, data: Dict) -> "Amendments":
-        return Amendments(**{
-            "uid": data["uid"],
-            "examination_ref": data["examenRef"],
-            "tri_amendment": get(data, "triAmendement") if get(data, "triAmendement") is not None and len(
-                get(data, "triAmendement")) > 0 else None,
-            "legislative_text_ref": data["texteLegislatifRef"],
-            "delivery_date": convert_to_datetime(get(data, "cycleDeVie", "dateDepot"), "%Y-%m-%d"),
-            "publication_date": convert_to_datetime(get(data, "cycleDeVie", "datePublication"), "%Y-%m-%d"),
-            "sort_date": convert_to_datetime(get(data, "cycleDeVie", "dateSort")),
-            "state": get(data, "cycleDeVie", "etatDesTraitements", "etat", "libelle"),
-            "sub_state": get(data, "cycleDeVie", "etatDesTraitements", "sousEtat", "libelle"),
-            "representation": get(data, "representations", "representation", "contenu", "documentURI"),
-            "article99": data["article99"].lower() == "true",
-            "contentTitle": decode_html_french_string(get(data, "corps", "contenuAuteur", "dispositif", default="")),
-            "contentSummary": decode_html_french_string(get(data, "corps", "contenuAuteur", "exposeSommaire", default=""))
-        })
-
-
-class Organs(Base):
+        return cls.export_spec.to_entity(cls, data)
+
+
+class Organs(Fingerprinted, Base):
     __tablename__ = "organs"
 
     uid = Column(String, primary_key=True)
@@ -70,38 +107,36 @@ class Organs(Base):
     department_code = Column(String, nullable=True)
     department_label = Column(String, nullable=True)
 
-    parent_organ_uid: Mapped[str] = mapped_column(ForeignKey("organs.uid"))
+    parent_organ_uid: Mapped[Optional[str]] = mapped_column(ForeignKey("organs.uid"))
     parent: Mapped[Optional["Organs"]] = relationship(remote_side=uid)
     children: Mapped[List["Organs"]] = relationship(back_populates="parent")
 
+    export_spec = FieldSpec([
+        Field.of("uid", ("uid",), required=True),
+        Field.of("type", ("codeType",), required=True),
+        Field.of("label", ("libelle",), required=True),
+        Field.of("edition_label", ("libelleEdition",)),
+        Field.of("short_label", ("libelleAbrege",)),
+        Field.of("abbreviation_label", ("libelleAbrev",)),
+        Field.of("vi_mo_de_start_date", ("viMoDe", "dateDebut"), converter=to_date),
+        Field.of("vi_mo_de_end_date", ("viMoDe", "dateFin"), converter=to_date),
+        Field.of("vi_mo_de_approval_date", ("viMoDe", "dateAgrement"), converter=to_date),
+        Field.of("chamber", ("chambre",)),
+        Field.of("regime", ("regime",)),
+        Field.of("legislature", ("legislature",), converter=to_int),
+        Field.of("number", ("numero",), converter=to_int),
+        Field.of("region_type", ("lieu", "region", "type")),
+        Field.of("region_label", ("lieu", "region", "libelle")),
+        Field.of("department_code", ("lieu", "departement", "code")),
+        Field.of("department_label", ("lieu", "departement", "libelle"))
+    ], extras=[Field.of("parent", ("organeParent",))])
+
     @classmethod
     def from_data_export(cls, data: Dict) -> "Organs":
-        return Organs(**{
-            "uid": data["uid"],
-            "type": data["codeType"],
-            "label": data["libelle"],
-            "edition_label": get(data, "libelleEdition"),
-            "short_label": get(data, "libelleAbrege"),
-            "abbreviation_label": get(data, "libelleAbrev"),
-            "vi_mo_de_start_date": convert_to_datetime(get(data, "viMoDe", "dateDebut"), "%Y-%m-%d", as_date=True),
-            "vi_mo_de_end_date": convert_to_datetime(get(data, "viMoDe", "dateFin"), "%Y-%m-%d", as_date=True),
-            "vi_mo_de_approval_date": convert_to_datetime(get(data, "viMoDe", "dateAgrement"), "%Y-%m-%d", as_date=True),
-            "chamber": get(data, "chambre"),
-            "regime": get(data, "regime"),
-            "legislature": to_int(get(data, "legislature")),
-            "number": to_int(get(data, "numero")),
-            "region_type": get(data, "lieu", "region", "type"),
-            "region_label": get(data, "lieu", "region", "libelle"),
-            "department_code": get(data, "lieu", "departement", "code"),
-            "department_label": get(data, "lieu", "departement", "libelle")
-        })
-
-    def __eq__(self, other: "Organs"):
-        to_compare = [k for k in (self.__dict__.keys() & other.__dict__.keys()) if not k.startswith("_")]
-        return all([self.__dict__[k] == other.__dict__[k] for k in to_compare])
-
-
-class Actors(Base):
+        return cls.export_spec.to_entity(cls, data)
+
+
+class Actors(Fingerprinted, Base):
     __tablename__ = "actors"
 
     uid = Column(String, primary_key=True)
@@ -115,34 +150,30 @@ class Actors(Base):
     death_date = Column(Date)
     uri_hatvp = Column(String)
 
-    profession_id: Mapped[int] = mapped_column(ForeignKey("professions.id"))
+    profession_id: Mapped[Optional[int]] = mapped_column(ForeignKey("professions.id"))
     profession: Mapped[Optional["Professions"]] = relationship(back_populates="actors")
     addresses: Mapped[List["ActorsAddresses"]] = relationship(back_populates="actor")
 
+    export_spec = FieldSpec([
+        Field.of("uid", ("uid", "#text"), required=True),
+        Field.of("title", ("etatCivil", "ident", "civ"), required=True),
+        Field.of("surname", ("etatCivil", "ident", "nom"), required=True),
+        Field.of("name", ("etatCivil", "ident", "prenom"), required=True),
+        Field.of("alpha", ("etatCivil", "ident", "alpha"), required=True),
+        Field.of("trigram", ("etatCivil", "ident", "trigramme")),
+        Field.of("birthdate", ("etatCivil", "infoNaissance", "dateNais"), converter=to_date),
+        Field.of("birthplace", ("etatCivil", "infoNaissance", "villeNais"), ("etatCivil", "infoNaissance", "depNais"),
+                 ("etatCivil", "infoNaissance", "paysNais"), converter=join_non_null),
+        Field.of("death_date", ("etatCivil", "dateDeces"), converter=to_date),
+        Field.of("uri_hatvp", ("uri_hatvp",))
+    ], extras=[Field.of("profession", ("profession", "libelleCourant"), converter=lower)])
+
     @classmethod
     def from_data_export(cls, data: Dict) -> "Actors":
-        birthplace = [get(data, "etatCivil", "infoNaissance", f) for f in ["villeNais", "depNais", "paysNais"]]
-        birthplace = ','.join([b for b in birthplace if b is not None])
-        return Actors(**{
-            "uid": data["uid"]["#text"],
-            "title": data["etatCivil"]["ident"]["civ"],
-            "surname": data["etatCivil"]["ident"]["nom"],
-            "name": data["etatCivil"]["ident"]["prenom"],
-            "alpha": data["etatCivil"]["ident"]["alpha"],
-            "trigram": get(data, "etatCivil", "ident", "trigramme"),
-            "birthdate": convert_to_datetime(get(data, "etatCivil", "infoNaissance", "dateNais"), "%Y-%m-%d",
-                                             as_date=True),
-            "birthplace": birthplace if len(birthplace) > 0 else None,
-            "death_date": convert_to_datetime(data["etatCivil"].get("dateDeces"), "%Y-%m-%d", as_date=True),
-            "uri_hatvp": get(data, "uri_hatvp")
-        })
-
-    def __eq__(self, other: "Actors"):
-        to_compare = [k for k in (self.__dict__.keys() & other.__dict__.keys()) if not k.startswith("_")]
-        return all([self.__dict__[k] == other.__dict__[k] for k in to_compare])
-
-
-class ActorsAddresses(Base):
+        return cls.export_spec.to_entity(cls, data)
+
+
+class ActorsAddresses(Fingerprinted, Base):
     __tablename__ = "actors_addresses"
 
     uid = Column(String, primary_key=True)
@@ -157,31 +188,29 @@ class ActorsAddresses(Base):
     address = Column(String, nullable=True)
     phone = Column(String, nullable=True)
 
-    actor_uid: Mapped[str] = mapped_column(ForeignKey("actors.uid"))
+    actor_uid: Mapped[Optional[str]] = mapped_column(ForeignKey("actors.uid"))
     actor: Mapped["Actors"] = relationship(back_populates="addresses")
 
+    export_spec = FieldSpec([
+        Field.of("uid", ("uid",), required=True),
+        Field.of("type", ("type",), converter=to_int),
+        Field.of("type_name", ("typeLibelle",), required=True),
+        Field.of("weight", ("poids",), converter=to_int),
+        Field.of("affiliate_address", ("adresseDeRattachement",)),
+        Field.of("street_number", ("numeroRue",)),
+        Field.of("street_name", ("nomRue",)),
+        Field.of("zip_code", ("codePostal",)),
+        Field.of("city", ("ville",)),
+        Field.of("address", ("valElec",), ("type",), converter=electronic_address),
+        Field.of("phone", ("valElec",), ("type",), converter=phone_number)
+    ], extras=[Field.of("actor", ("actorUid",))])
+
     @classmethod
     def from_data_export(cls, data: Dict) -> "ActorsAddresses":
-        return ActorsAddresses(**{
-            "uid": data["uid"],
-            "type": to_int(get(data, "type")),
-            "type_name": data["typeLibelle"],
-            "weight": to_int(get(data, "poids")),
-            "affiliate_address": get(data, "adresseDeRattachement"),
-            "street_number": get(data, "numeroRue"),
-            "street_name": get(data, "nomRue"),
-            "zip_code": get(data, "codePostal"),
-            "city": get(data, "ville"),
-            "address": get(data, "valElec") if data["type"] in ["22", "15"] else None,
-            "phone": get(data, "valElec") if data["type"] == "11" else None
-        })
-
-    def __eq__(self, other: "ActorsAddresses"):
-        to_compare = [k for k in (self.__dict__.keys() & other.__dict__.keys()) if not k.startswith("_")]
-        return all([self.__dict__[k] == other.__dict__[k] for k in to_compare])
-
-
-class Professions(Base):
+        return cls.export_spec.to_entity(cls, data)
+
+
+class Professions(Fingerprinted, Base):
     __tablename__ = "professions"
 
     id = Column(Integer, primary_key=True)
@@ -191,13 +220,15 @@ class Professions(Base):
 
     actors: Mapped[List["Actors"]] = relationship(back_populates="profession")
 
+    export_spec = FieldSpec([
+        Field.of("name", ("libelleCourant",), converter=lower),
+        Field.of("category", ("socProcINSEE", "catSocPro"), required=True),
+        Field.of("family", ("socProcINSEE", "famSocPro"), required=True)
+    ])
+
     @classmethod
     def from_data_export(cls, data: Dict) -> "Professions":
-        return Professions(**{
-            "name": get(data, "libelleCourant").lower() if get(data, "libelleCourant") is not None else None,
-            "category": data["socProcINSEE"]["catSocPro"],
-            "family": data["socProcINSEE"]["famSocPro"]
-        })
+        return cls.export_spec.to_entity(cls, data)
 
     def __eq__(self, other: "Professions"):
         return self.id == other.id
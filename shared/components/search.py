@@ -0,0 +1,119 @@
+import logging
+from typing import List, Tuple
+
+from sqlalchemy import text, select, and_, or_, case, literal, Column
+from sqlalchemy.orm import Session
+
+from .database import Database, SQLEngine
+from .models import Amendments
+
+SEARCH_CONFIGURATION = "french"
+SEARCH_VECTOR_COLUMN = "search_vector"
+SEARCH_INDEX = "amendments_search_idx"
+FULLTEXT_CATALOG = "state_tracker_catalog"
+# LCID of French, for the MSSQL word breaker and stemmer
+FULLTEXT_LANGUAGE = 1036
+
+
+def _postgres_search_index(session: Session):
+    # The DDL locks the whole table even when there is nothing to do, so it only runs when something is missing
+    table = {"table": Amendments.__tablename__}
+    has_column = session.execute(text(
+        "SELECT 1 FROM information_schema.columns WHERE table_schema = current_schema() AND table_name = :table "
+        "AND column_name = :column"), {**table, "column": SEARCH_VECTOR_COLUMN}).first() is not None
+    has_index = session.execute(text(
+        "SELECT 1 FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :table AND indexname = :index"),
+        {**table, "index": SEARCH_INDEX}).first() is not None
+    if not has_column:
+        # A stored generated column is only computed again for the rows an upsert writes, so that only the changed
+        # amendments are reindexed
+        logging.info(f"Adding the {SEARCH_VECTOR_COLUMN} column to {Amendments.__tablename__} ...")
+        session.execute(text(
+            f'ALTER TABLE {Amendments.__tablename__} ADD COLUMN IF NOT EXISTS {SEARCH_VECTOR_COLUMN} tsvector '
+            f'GENERATED ALWAYS AS ('
+            f'setweight(to_tsvector(\'{SEARCH_CONFIGURATION}\', coalesce("contentTitle", \'\')), \'A\') || '
+            f'setweight(to_tsvector(\'{SEARCH_CONFIGURATION}\', coalesce("contentSummary", \'\')), \'B\')) STORED'))
+    if not has_index:
+        logging.info(f"Creating the {SEARCH_INDEX} index ...")
+        session.execute(text(f"CREATE INDEX IF NOT EXISTS {SEARCH_INDEX} ON {Amendments.__tablename__} "
+                             f"USING GIN ({SEARCH_VECTOR_COLUMN})"))
+
+
+def _mssql_search_index(session: Session):
+    # Full-text DDL cannot run inside a user transaction
+    connection = session.connection(execution_options={"isolation_level": "AUTOCOMMIT"})
+    connection.execute(text(f"IF NOT EXISTS (SELECT 1 FROM sys.fulltext_catalogs WHERE name = '{FULLTEXT_CATALOG}') "
+                            f"CREATE FULLTEXT CATALOG {FULLTEXT_CATALOG}"))
+    if connection.execute(text("SELECT 1 FROM sys.fulltext_indexes WHERE object_id = OBJECT_ID(:table)"),
+                          {"table": Amendments.__tablename__}).first() is not None:
+        return
+    key_index = connection.execute(text("SELECT name FROM sys.indexes WHERE object_id = OBJECT_ID(:table) "
+                                        "AND is_primary_key = 1"), {"table": Amendments.__tablename__}).scalar_one()
+    # Automatic change tracking only reindexes the rows changed by the upserts
+    connection.execute(text(
+        f"CREATE FULLTEXT INDEX ON {Amendments.__tablename__} "
+        f"(contentTitle LANGUAGE {FULLTEXT_LANGUAGE}, contentSummary LANGUAGE {FULLTEXT_LANGUAGE}) "
+        f"KEY INDEX {key_index} ON {FULLTEXT_CATALOG} WITH CHANGE_TRACKING AUTO"))
+
+
+@Database.with_session
+def ensure_search_index(session: Session):
+    """
+    Creates the full-text index over the content of the amendments when missing: a weighted tsvector column with the
+    French configuration and its GIN index on Postgres, a full-text catalog and index on MSSQL. Both are kept up to date
+    by the database as the amendments are upserted. Other engines are searched with LIKE and have no index.
+    """
+    match Database.sql_engine():
+        case SQLEngine.POSTGRES:
+            _postgres_search_index(session)
+        case SQLEngine.MSSQL:
+            _mssql_search_index(session)
+        case _:
+            logging.info("No full-text index on this engine, amendments are searched with LIKE.")
+
+
+def _postgres_search(session: Session, query: str, limit: int) -> List[Tuple[str, float]]:
+    return [(r[0], float(r[1])) for r in session.execute(text(
+        f"SELECT uid, ts_rank_cd({SEARCH_VECTOR_COLUMN}, query) AS rank "
+        f"FROM {Amendments.__tablename__}, websearch_to_tsquery('{SEARCH_CONFIGURATION}', :query) query "
+        f"WHERE {SEARCH_VECTOR_COLUMN} @@ query ORDER BY rank DESC, uid LIMIT :limit"),
+        {"query": query, "limit": limit})]
+
+
+def _mssql_search(session: Session, query: str, limit: int) -> List[Tuple[str, float]]:
+    return [(r[0], float(r[1])) for r in session.execute(text(
+        f"SELECT TOP (:limit) a.uid, k.RANK FROM FREETEXTTABLE({Amendments.__tablename__}, "
+        f"(contentTitle, contentSummary), :query, LANGUAGE {FULLTEXT_LANGUAGE}, :limit) AS k "
+        f"JOIN {Amendments.__tablename__} a ON a.uid = k.[KEY] ORDER BY k.RANK DESC, a.uid"),
+        {"query": query, "limit": limit})]
+
+
+def _like_search(session: Session, query: str, limit: int) -> List[Tuple[str, float]]:
+    # Every term has to appear, matches in the title rank above matches in the summary
+    terms = query.split()
+    if len(terms) <= 0:
+        return []
+    title: Column[str] = Amendments.contentTitle
+    summary: Column[str] = Amendments.contentSummary
+    rank = sum((case((title.icontains(t, autoescape=True), 2), else_=0) +
+                case((summary.icontains(t, autoescape=True), 1), else_=0) for t in terms), literal(0))
+    statement = select(Amendments.uid, rank.label("rank")) \
+        .where(and_(*(or_(title.icontains(t, autoescape=True), summary.icontains(t, autoescape=True))
+                      for t in terms))) \
+        .order_by(rank.desc(), Amendments.uid).limit(limit)
+    return [(r[0], float(r[1])) for r in session.execute(statement)]
+
+
+@Database.with_session
+def search_amendments(query: str, session: Session, limit: int = 20) -> List[Tuple[str, float]]:
+    """
+    Uids of the amendments whose title or summary match `query`, with their rank, best first. The query is read as a
+    web search on Postgres (quoted phrases, -excluded words, or) and as free text on MSSQL.
+    """
+    match Database.sql_engine():
+        case SQLEngine.POSTGRES:
+            return _postgres_search(session, query, limit)
+        case SQLEngine.MSSQL:
+            return _mssql_search(session, query, limit)
+        case _:
+            return _like_search(session, query, limit)
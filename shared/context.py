@@ -1,19 +1,32 @@
+import importlib
+from typing import Callable
+
 from dependency_injector import containers, providers
 
 from .env import Environment
-from .components import Cosmos, JobsTable, Database
+from .components import Database
+
+
+def lazy(path: str) -> Callable:
+    """Factory of the class at `path`, imported when the first instance is created rather than with the container."""
+    module, name = path.rsplit(".", 1)
+
+    def create(*args, **kwargs):
+        return getattr(importlib.import_module(module), name)(*args, **kwargs)
+
+    return create
 
 
 class Gateways(containers.DeclarativeContainer):
     config = providers.Configuration()
 
     cosmos_client = providers.Singleton(
-        Cosmos,
+        lazy("shared.components.cosmos.Cosmos"),
         connection_string=config.azure.cosmos_connection_string
     )
 
     jobs_table = providers.Singleton(
-        JobsTable,
+        lazy("shared.components.jobs.JobsTable"),
         storage_account_name=config.azure.storage_account_name,
         key=config.azure.storage_account_key,
         table_name=config.azure.jobs_table_name
@@ -1,5 +1,9 @@
 import os
+import tempfile
 from dataclasses import dataclass
+from typing import Dict
+
+from .utils import ExecutorKind, to_int
 
 
 @dataclass
@@ -17,3 +21,29 @@ class Environment:
     sql_user = os.getenv("SQL_USER")
     sql_password = os.getenv("SQL_PASSWORD")
     sql_engine = os.getenv("SQL_ENGINE")
+    parallel_workers = os.getenv("PARALLEL_WORKERS")
+    parallel_executor = os.getenv("PARALLEL_EXECUTOR", "process")
+    amendments_batch_size = int(os.getenv("AMENDMENTS_BATCH_SIZE", "5000"))
+    full_load = os.getenv("FULL_LOAD", "false").lower() == "true"
+    snapshot_directory = os.getenv("SNAPSHOT_DIRECTORY")
+    manifest_directory = os.getenv("MANIFEST_DIRECTORY")
+
+    @classmethod
+    def parallelism(cls) -> Dict:
+        return {"workers": to_int(cls.parallel_workers), "executor": ExecutorKind.from_string(cls.parallel_executor)}
+
+    @classmethod
+    def task_parallelism(cls) -> Dict:
+        """
+        parallelism for code running in run_tasks threads, always on threads: forking a process pool while other
+        threads hold locks (logging, SQLAlchemy pools) can deadlock the children.
+        """
+        return {**cls.parallelism(), "executor": ExecutorKind.THREAD}
+
+    @classmethod
+    def snapshots(cls) -> str:
+        return cls.snapshot_directory or os.path.join(tempfile.gettempdir(), "snapshots")
+
+    @classmethod
+    def manifest_path(cls, job: str) -> str:
+        return os.path.join(cls.manifest_directory or os.path.join(tempfile.gettempdir(), "manifests"), f"{job}.json")
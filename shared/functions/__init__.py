@@ -1,2 +1,4 @@
 from .amendments import amendments
-from .deputies import deputies
\ No newline at end of file
+from .deputies import deputies
+# Wires the jobs above to the application container
+from .. import context
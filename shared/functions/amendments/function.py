@@ -1,66 +1,206 @@
 import logging
-from typing import MutableMapping, List, Dict
+import re
+from functools import partial
+from concurrent.futures import Executor
+from typing import MutableMapping, List, Dict, Callable, Optional, Tuple
 
 from dependency_injector.wiring import inject, Provide
-from sqlalchemy import select
-from sqlalchemy.orm import Session
 
 from ...env import Environment
-from ...utils import download_file, get_all_files_in_dir, delete_keys_from_dict, read_json, \
-    wrap_around_progress_bar, now_with_tz
-from ...components import JobsTable, Amendments, Database, insert_or_update
-from dateutil import parser
+from ...utils import download_file, read_json_member, wrap_around_executor_progress_bar, \
+    now_with_tz, ZipSource, parse_datetime, executor_pool, batched, \
+    PipelineMetrics, Snapshot, Manifest, read_zip_member, decode_json
+from ...components import JobsTable, Amendments, upsert_rows, drop_unchanged_entities, bulk_load_rows, is_empty, \
+    ensure_search_index, ensure_columns
 import datetime
 
 JOB_PARTITION_KEY = "amendments"
-USELESS_DATA = [
+USELESS_DATA = frozenset([
     "@xmlns",
     "@xmlns:xsi",
     "@xsi:nil"
-]
+])
+KEY_COLUMNS = [Amendments.uid.key, "fingerprint"]
+DATE_SORT = re.compile(rb'"dateSort"\s*:\s*"([^"\\]*)"')
 
 
-def map_to_entity(entry: MutableMapping) -> Amendments:
-    entry = entry.get("amendement")
-    entry = delete_keys_from_dict(entry, USELESS_DATA)
-
-    return Amendments.from_data_export(entry)
+def map_to_row(entry: MutableMapping) -> Dict:
+    return Amendments.export_spec.to_dict(entry.get("amendement"))
 
 
 def get_date(entry: MutableMapping) -> datetime.datetime:
     data = entry["amendement"].get("cycleDeVie", {}).get("dateSort", "")
     if type(data) is dict:
         data = ""
-    return parser.parse(data) if len(data) > 0 else now_with_tz()
-
-
-@Database.with_session
-def drop_data(data: List[Dict], last_run: datetime.datetime, session: Session) -> List[Dict]:
-    recent_data = [d for d in data if get_date(d) > last_run]
-    already_existing = {a.uid: "" for a in session.execute(select(Amendments.uid)).all()}
-    return [d for d in recent_data if d["amendement"]["uid"] not in already_existing]
+    return parse_datetime(data) if len(data) > 0 else now_with_tz()
+
+
+def drop_data(data: List[Dict], last_run: datetime.datetime) -> List[Dict]:
+    return [d for d in data if get_date(d) > last_run]
+
+
+def sorted_before(data: bytes, last_run: datetime.datetime) -> bool:
+    """
+    Whether the raw amendment would be dropped by drop_data, found without decoding it: only when its single dateSort
+    key holds a plain string. Any other case (missing, nil, several matches, unparsable) is left to the full parse.
+    """
+    if data.count(b'"dateSort"') != 1:
+        return False
+    match = DATE_SORT.search(data)
+    if match is None or len(match.group(1)) <= 0:
+        return False
+    try:
+        return parse_datetime(match.group(1).decode()) <= last_run
+    except ValueError:
+        return False
+
+
+def read_if_sorted_after(archive_path: str, last_run: datetime.datetime, name: str) -> Optional[Dict]:
+    """Reads the amendment `name` like read_json_member, unless its raw bytes already show it is dropped (None)."""
+    data = read_zip_member(archive_path, name)
+    return None if sorted_before(data, last_run) else decode_json(data, USELESS_DATA)
+
+
+def read_row(read: Callable[[str], Optional[Dict]], last_run: Optional[datetime.datetime], name: str) -> \
+        Tuple[Optional[Dict], bool]:
+    """
+    Reads, filters and maps the amendment `name` in a single worker call, so that only its row crosses the process
+    boundary. Returns the row, or None when it is dropped, and whether the amendment was decoded. Nothing is filtered
+    when `last_run` is None.
+    """
+    data = read(name)
+    # Amendments dropped from their raw bytes by read_if_sorted_after are None
+    if data is None:
+        return None, False
+    if last_run is not None and get_date(data) <= last_run:
+        return None, True
+    return map_to_row(data), True
+
+
+def map_batch(names: List[str], read: Callable[[str], Optional[Dict]], last_run: datetime.datetime,
+              pool: Optional[Executor], batch: int, metrics: PipelineMetrics, full_load: bool = False) -> List[Dict]:
+    with metrics.stage("read_map", len(names)) as stage:
+        results = wrap_around_executor_progress_bar(partial(read_row, read, None if full_load else last_run), names,
+                                                    f"Reading JSON files (batch {batch})", pool=pool)
+        transformed_data = [row for row, _ in results if row is not None]
+        decoded = sum(1 for _, was_decoded in results if was_decoded)
+        stage.items_out += len(transformed_data)
+    metrics.count("scan_dropped", len(names) - decoded)
+    if not full_load:
+        logging.info(f"Dropped {len(names) - len(transformed_data)} amendments, {len(names) - decoded} of them "
+                     f"without decoding.")
+    return transformed_data
+
+
+def process_batch(names: List[str], read: Callable[[str], Optional[Dict]], last_run: datetime.datetime,
+                  pool: Optional[Executor], batch: int, metrics: PipelineMetrics, full_load: bool = False,
+                  snapshot: Optional[Snapshot] = None, part: str = "") -> int:
+    # The snapshot the rows are read from, when this part was already written to it
+    stored = snapshot if snapshot is not None and snapshot.exists(part) else None
+    if stored is not None:
+        with metrics.stage("snapshot_read", len(names)) as stage:
+            # The lookup only needs the keys and fingerprints, the changed rows are read in full after it
+            transformed_data = stored.read(part, columns=None if full_load else KEY_COLUMNS)
+            stage.items_out += len(transformed_data)
+    else:
+        transformed_data = map_batch(names, read, last_run, pool, batch, metrics, full_load)
+        if snapshot is not None:
+            with metrics.stage("snapshot_write", len(transformed_data)):
+                snapshot.write(part, transformed_data)
+    if len(transformed_data) <= 0:
+        return 0
+
+    if full_load:
+        changed_data = transformed_data
+    else:
+        with metrics.stage("lookup", len(transformed_data)) as stage:
+            changed_data = drop_unchanged_entities(transformed_data, Amendments.uid)
+            if stored is not None:
+                changed_data = stored.read(part, where_in=(Amendments.uid.key, {d["uid"] for d in changed_data}))
+            stage.items_out += len(changed_data)
+        logging.info(f"{len(transformed_data) - len(changed_data)} amendments did not change.")
+    del transformed_data
+    with metrics.stage("write", len(changed_data)) as stage:
+        written = (bulk_load_rows if full_load else upsert_rows)(changed_data, Amendments.__table__)
+        stage.items_out += written
+    metrics.record_writes("sql", written)
+    return written
 
 
 @inject
 def amendments(jobs: JobsTable = Provide["gateways.jobs_table"]) -> None:
-    last_run = jobs.get_last_run(JOB_PARTITION_KEY).get("run_datetime")
-    logging.info(f"Last run was on {last_run}")
-
-    logging.info(f"Downloading amendments from {Environment.amendments_url}...")
-    data_dir = download_file(Environment.amendments_url, auto_extract=True)
-    json_files = get_all_files_in_dir(data_dir)
-    logging.info(f"Found {len(json_files)} amendments ! Applying transformations and filtering ...")
-
-    json_data = wrap_around_progress_bar(lambda x: read_json(x), json_files, "Reading JSON files")
-    logging.info("Dropping useless data ...")
-    kept_data = drop_data(json_data, last_run)
-    logging.info(f"Dropped {len(json_data) - len(kept_data)} amendments.")
-
-    if len(kept_data) > 0:
-        transformed_data = wrap_around_progress_bar(lambda x: map_to_entity(x), kept_data, "Mapping data")
-        insert_or_update(transformed_data, Amendments.uid)
-    else:
-        logging.info("No data to upsert !")
-
-    jobs.update_last_run(JOB_PARTITION_KEY, run_datetime=now_with_tz())
-    logging.info("Done")
+    with jobs.lease(JOB_PARTITION_KEY) as lease:
+        if lease is None:
+            logging.info("Another amendments run is in progress. Skipping.")
+            return
+
+        metrics = PipelineMetrics()
+        previous_run = jobs.get_last_run(JOB_PARTITION_KEY)
+        # Set on every run, and to the epoch before the first one
+        last_run: datetime.datetime = previous_run["run_datetime"]
+        logging.info(f"Last run was on {last_run}")
+
+        logging.info(f"Downloading amendments from {Environment.amendments_url}...")
+        with metrics.stage("download"):
+            download = download_file(Environment.amendments_url)
+        if download.not_modified and previous_run.get("source_sha256") == download.sha256 and not Environment.full_load:
+            logging.info("Amendments archive did not change since last run. Skipping.")
+            return
+
+        with metrics.stage("schema"):
+            ensure_columns([Amendments.__table__.c.fingerprint])
+        # The index is then kept up to date by the database, for the amendments the upserts write
+        with metrics.stage("search_index"):
+            ensure_search_index()
+
+        with metrics.stage("extract") as stage:
+            archive = ZipSource(download.path, extension="json")
+            stage.items_out = len(archive)
+        with archive, executor_pool(**Environment.parallelism(), preload=[__name__]) as pool:
+            checkpoint = jobs.get_checkpoint(JOB_PARTITION_KEY, download.sha256)
+            # An interrupted full load stays one, the amendments it already wrote make the table non-empty
+            full_load = Environment.full_load or checkpoint.get("stage") == "full_load" or \
+                is_empty(Amendments.__table__)
+            if full_load:
+                logging.info("Full load: amendments are not filtered against the last run nor the stored ones.")
+
+            manifest = Manifest.load(Environment.manifest_path(JOB_PARTITION_KEY))
+            members = archive.manifest()
+            scope = ""
+            if not full_load and manifest.archive_sha256 is not None:
+                archive.restrict_to(manifest.changed(members))
+                scope = f"changed-since-{manifest.archive_sha256[:16]}"
+                logging.info(f"{len(members) - len(archive)} amendments files did not change since the last archive.")
+                metrics.count("unchanged_members", len(members) - len(archive))
+
+            logging.info(f"Found {len(archive)} amendments ! Processing them by batches of "
+                         f"{Environment.amendments_batch_size} ...")
+            # Outside full loads, amendments sorted before the last run are dropped before being decoded
+            read: Callable[[str], Optional[Dict]] = \
+                partial(read_json_member, archive.path, drop_keys=USELESS_DATA) if full_load else \
+                partial(read_if_sorted_after, archive.path, last_run)
+            # The offset counts members in archive order, which is the same across runs on the same archive (and
+            # manifest)
+            offset = checkpoint.get("batch_offset", 0)
+            if offset > 0:
+                logging.info(f"Resuming the interrupted run after its first {offset} amendments.")
+                metrics.count("resumed_amendments", offset)
+            snapshot = Snapshot(Environment.snapshots(), JOB_PARTITION_KEY, download.sha256, scope)
+            # The amendments kept in a part depend on the last run, except on full loads which keep all of them
+            since = 0 if full_load else int(last_run.timestamp())
+            upserted = 0
+            for i, names in enumerate(batched(archive.names[offset:], Environment.amendments_batch_size)):
+                lease.ensure_held()
+                part = f"amendments/{since}-{offset}-{offset + len(names)}"
+                upserted += process_batch(names, read, last_run, pool, i + 1, metrics, full_load, snapshot, part)
+                offset += len(names)
+                jobs.save_checkpoint(JOB_PARTITION_KEY, download.sha256, "full_load" if full_load else "batches",
+                                     batch_offset=offset)
+        logging.info(f"Upserted {upserted} amendments.")
+
+        metrics.log()
+        jobs.update_last_run(JOB_PARTITION_KEY, metrics=metrics.as_fields(), run_datetime=now_with_tz(),
+                             source_sha256=download.sha256)
+        jobs.clear_checkpoint(JOB_PARTITION_KEY)
+        Manifest(download.sha256, members).save(Environment.manifest_path(JOB_PARTITION_KEY))
+        logging.info("Done")
@@ -1,21 +1,29 @@
 import logging
-from typing import List, Dict, Tuple
+from functools import partial
+from typing import List, Dict, Tuple, Callable, Any, Optional, Type, Iterable
 
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from ...components import Professions, insert_or_update, drop_data_json_entry, Actors, Database, ActorsAddresses
-from ...utils import get_all_files_in_dir, wrap_around_progress_bar, read_json, get, delete_keys_from_dict
+from ...components import Professions, insert_or_update, Actors, Database, ActorsAddresses, existing_keys, \
+    keep_changed, upsert_rows, bulk_load_rows, is_empty
+from ...components.models import lower, Base
+from ...env import Environment
+from ...utils import wrap_around_executor_progress_bar, read_json_member, get, ZipSource, PipelineMetrics, Snapshot
 
-USELESS_DATA = [
+USELESS_DATA = frozenset([
     "@xmlns",
     "@xmlns:xsi",
     "@xsi:nil",
     "@xsi:type"
-]
+])
+# Mandates are not loaded yet, their subtree is left as it is rather than cleaned
+UNREAD_DATA = frozenset(["mandats"])
+SNAPSHOT_DATASETS = ("professions", "addresses", "actors")
 
 
 def split_data(data: List[Dict]) -> Tuple[List[Dict], List[Dict], List[Dict], List[Dict]]:
-    data_cleaned = [d["acteur"] for d in delete_keys_from_dict(data, USELESS_DATA)]
+    data_cleaned = [d["acteur"] for d in data]
     professions = list({get(d, "profession", "libelleCourant"): get(d, "profession") for d in
                         data_cleaned if get(d, "profession") is not None}.values())
 
@@ -33,28 +41,47 @@ def split_data(data: List[Dict]) -> Tuple[List[Dict], List[Dict], List[Dict], Li
     return professions, addresses, mandates, data_cleaned
 
 
-def transform_professions(data: List[Dict]) -> List[Professions]:
+def map_profession(data: Dict) -> Dict:
+    return Professions.export_spec.to_dict(data)
+
+
+def map_actor(data: Dict) -> Dict:
+    # The profession is kept by name, it is resolved to its id on load
+    return {**Actors.export_spec.to_dict(data), "profession": lower(get(data, "profession", "libelleCourant"))}
+
+
+def map_address(data: Dict) -> Dict:
+    # The actor is only linked on load, when it exists
+    return {**ActorsAddresses.export_spec.to_dict(data), "actor_uid": data["actorUid"]}
+
+
+def _entity(model: Type[Base], row: Dict) -> Any:
+    return model(**{k: v for k, v in row.items() if k in model.__table__.c})
+
+
+@Database.with_session
+def transform_professions(data: List[Dict], metrics: PipelineMetrics, session: Session) -> List[Professions]:
     logging.info("Transforming professions ...")
-    unique_entries = list(
-        {get(d, "libelleCourant").lower() if get(d, "libelleCourant") is not None else None: d for d in data}.values())
-    for e in unique_entries:
-        if "libelleCourant" in e and e["libelleCourant"] is not None:
-            e["libelleCourant"] = e["libelleCourant"].lower()
-    to_keep = drop_data_json_entry(unique_entries, Professions.name, "libelleCourant")
-    return [Professions.from_data_export(e) for e in to_keep]
+    unique_entries = list({d["name"]: d for d in data}.values())
+    with metrics.stage("professions_lookup", len(unique_entries)) as stage:
+        existing = existing_keys(session, Professions.name, (d["name"] for d in unique_entries))
+        professions = [_entity(Professions, d) for d in unique_entries if d["name"] not in existing]
+        stage.items_out += len(professions)
+    return professions
 
 
 @Database.with_session
-def transform_addresses(data: List[Dict], session: Session) -> List[ActorsAddresses]:
+def transform_addresses(data: List[Dict], metrics: PipelineMetrics, session: Session) -> List[ActorsAddresses]:
     logging.info("Transforming addresses ...")
-    actors = {a.uid: a for a in session.query(Actors).all()}
-
-    addresses = {a.uid: a for a in session.query(ActorsAddresses).all()}
-    new_addresses = {aa["uid"]: ActorsAddresses.from_data_export(aa) for aa in data}
-    for d in data:
-        if d["actorUid"] in actors:
-            new_addresses[d["uid"]].actor = actors[d["actorUid"]]
-    return [aa for aa in new_addresses.values() if aa.uid not in addresses or aa != addresses[aa.uid]]
+    with metrics.stage("addresses_lookup", len(data)) as stage:
+        actors = existing_keys(session, Actors.uid, (d["actor_uid"] for d in data))
+        new_addresses = {}
+        for d in data:
+            actor_uid = d["actor_uid"] if d["actor_uid"] in actors else None
+            new_addresses[d["uid"]] = _entity(ActorsAddresses, {**d, "actor_uid": actor_uid})
+        changed = keep_changed(session, list(new_addresses.values()), ActorsAddresses.uid)
+        stage.items_out += len(changed)
+    return changed
 
 
 def transform_mandates(data: List[Dict]) -> List:
@@ -62,30 +89,82 @@ def transform_mandates(data: List[Dict]) -> List:
 
 
 @Database.with_session
-def transform_actors(data: List[Dict], session: Session) -> List[Actors]:
+def transform_actors(data: List[Dict], metrics: PipelineMetrics, session: Session) -> List[Dict]:
     logging.info("Transforming actors ...")
-    data_dict = {get(d, "uid", "#text"): d for d in data}
-    professions = {p.name: p for p in session.query(Professions).all()}
-
-    actors = {a.uid: a for a in session.query(Actors).all()}
-    new_actors = [Actors.from_data_export(d) for d in data]
-    for a in new_actors:
-        profession = get(data_dict[a.uid], "profession", "libelleCourant")
-        a.profession = professions[profession.lower() if profession is not None else None]
-
-    return [a for a in new_actors if a.uid not in actors or a != actors[a.uid]]
-
-
-def actors_task(data_dir: str) -> None:
+    with metrics.stage("actors_lookup", len(data)) as stage:
+        # Actors are written as rows, the profession is resolved to its id without linking ORM entities
+        rows: Iterable[Tuple[Optional[str], int]] = session.execute(select(Professions.name, Professions.id)).tuples()
+        professions = {name: id_ for name, id_ in rows}
+        columns = [c.name for c in Actors.__table__.columns]
+        new_actors = [{**{c: d.get(c) for c in columns}, "profession_id": professions[d["profession"]]} for d in data]
+        changed = keep_changed(session, new_actors, Actors.uid)
+        stage.items_out += len(changed)
+    return changed
+
+
+def read_actors(source: ZipSource, metrics: PipelineMetrics, snapshot: Optional[Snapshot] = None) -> \
+        Tuple[List[Dict], List[Dict], List[Dict], List[Dict]]:
+    """Professions, addresses, mandates and actors of the export, mapped to rows, or read from `snapshot`."""
     logging.info("Integrating actors ...")
-    json_files = get_all_files_in_dir(data_dir)
-    logging.info(f"Found {len(json_files)} actors ! Applying transformations and filtering ...")
-
-    json_data = wrap_around_progress_bar(lambda x: read_json(x), json_files, "Reading JSON files")
+    if snapshot is not None and all(snapshot.exists(d) for d in SNAPSHOT_DATASETS):
+        with metrics.stage("actors_snapshot_read") as stage:
+            professions, addresses, actors = (snapshot.read(d) for d in SNAPSHOT_DATASETS)
+            stage.items_out += len(actors)
+        return professions, addresses, [], actors
+
+    logging.info(f"Found {len(source)} actors ! Applying transformations and filtering ...")
+    with source, metrics.stage("actors_read", len(source)) as stage:
+        read = partial(read_json_member, source.path, drop_keys=USELESS_DATA, skip_keys=UNREAD_DATA)
+        json_data = wrap_around_executor_progress_bar(read, source.names, "Reading JSON files",
+                                                      **Environment.task_parallelism())
+        stage.items_out += len(json_data)
     professions, addresses, mandates, actors = split_data(json_data)
-
-    for data, transform, identifier in [(professions, transform_professions, Professions.name),
-                                        (actors, transform_actors, Actors.uid),
-                                        (addresses, transform_addresses, ActorsAddresses.uid)]:
-        transformed = transform(data)
-        insert_or_update(transformed, identifier)
+    del json_data
+
+    with metrics.stage("professions_map", len(professions)) as stage:
+        professions = [map_profession(p) for p in professions]
+        stage.items_out += len(professions)
+    with metrics.stage("addresses_map", len(addresses)) as stage:
+        addresses = [map_address(a) for a in addresses]
+        stage.items_out += len(addresses)
+    with metrics.stage("actors_map", len(actors)) as stage:
+        actors = wrap_around_executor_progress_bar(map_actor, actors, "Mapping actors",
+                                                   **Environment.task_parallelism())
+        stage.items_out += len(actors)
+
+    if snapshot is not None:
+        with metrics.stage("actors_snapshot_write", len(actors)):
+            for dataset, rows in zip(SNAPSHOT_DATASETS, (professions, addresses, actors)):
+                snapshot.write(dataset, rows)
+    return professions, addresses, mandates, actors
+
+
+def _load(name: str, data: List[Dict], transform: Callable, write: Callable[[List], int],
+          metrics: PipelineMetrics) -> int:
+    transformed = transform(data, metrics)
+    with metrics.stage(f"{name}_write", len(transformed)) as stage:
+        written = write(transformed)
+        stage.items_out += written
+    metrics.record_writes("sql", written)
+    return written
+
+
+def load_professions(export: Tuple, metrics: PipelineMetrics) -> int:
+    professions, _, _, _ = export
+    return _load("professions", professions, transform_professions,
+                 partial(insert_or_update, entity_id_column=Professions.name), metrics)
+
+
+def load_actors(export: Tuple, professions: int, metrics: PipelineMetrics) -> int:
+    # `professions` (written by load_professions) is only awaited, actors reference them
+    _, _, _, actors = export
+    full_load = Environment.full_load or is_empty(Actors.__table__)
+    write = bulk_load_rows if full_load else upsert_rows
+    return _load("actors", actors, transform_actors, partial(write, table=Actors.__table__), metrics)
+
+
+def load_addresses(export: Tuple, actors: int, metrics: PipelineMetrics) -> int:
+    # `actors` (written by load_actors) is only awaited, addresses reference them
+    _, addresses, _, _ = export
+    return _load("addresses", addresses, transform_addresses,
+                 partial(insert_or_update, entity_id_column=ActorsAddresses.uid), metrics)
@@ -1,29 +1,89 @@
 import logging
-import os.path
+from functools import partial
 
 from dependency_injector.wiring import inject, Provide
 
-from .actors import actors_task
-from .organs import organs_task
-from ...components import JobsTable
+from .actors import read_actors, load_professions, load_actors, load_addresses
+from .organs import organs_task, members_to_read_again
+from ...components import JobsTable, Actors, ActorsAddresses, Organs, Professions, is_empty, ensure_columns
 from ...env import Environment
-from ...utils import download_file, now_with_tz
+from ...utils import download_file, now_with_tz, ZipSource, PipelineMetrics, Task, run_tasks, Snapshot, \
+    Manifest
 
 JOB_PARTITION_KEY = "deputies"
 
 
 @inject
 def deputies(jobs: JobsTable = Provide["gateways.jobs_table"]) -> None:
-    last_run = jobs.get_last_run(JOB_PARTITION_KEY).get("run_datetime")
-    logging.info(f"[{JOB_PARTITION_KEY.upper()} Job] - Last run was on {last_run}")
-
-    logging.info(f"Downloading deputies, mandates and organs from {Environment.deputies_url}...")
-    data_dir = download_file(Environment.deputies_url, auto_extract=True)
-    #data_dir = "/home/pbreton/Downloads/AMO10_deputes_actifs_mandats_actifs_organes.json"
-    actors_task(os.path.join(data_dir, "json", "acteur"))
-    organs_task(os.path.join(data_dir, "json", "organe"))
-    # TODO: add deports
-    # deports_task(os.path.join(data_dir, "json", "deport"))
-
-    jobs.update_last_run(JOB_PARTITION_KEY, run_datetime=now_with_tz())
-    logging.info("Done")
+    with jobs.lease(JOB_PARTITION_KEY) as lease:
+        if lease is None:
+            logging.info(f"[{JOB_PARTITION_KEY.upper()} Job] - Another run is in progress. Skipping.")
+            return
+
+        metrics = PipelineMetrics()
+        previous_run = jobs.get_last_run(JOB_PARTITION_KEY)
+        last_run = previous_run.get("run_datetime")
+        logging.info(f"[{JOB_PARTITION_KEY.upper()} Job] - Last run was on {last_run}")
+
+        logging.info(f"Downloading deputies, mandates and organs from {Environment.deputies_url}...")
+        with metrics.stage("download"):
+            download = download_file(Environment.deputies_url)
+        if download.not_modified and previous_run.get("source_sha256") == download.sha256 and not Environment.full_load:
+            logging.info(f"[{JOB_PARTITION_KEY.upper()} Job] - Archive did not change since last run. Skipping.")
+            return
+
+        with metrics.stage("schema"):
+            ensure_columns(model.__table__.c.fingerprint for model in (Actors, ActorsAddresses, Professions, Organs))
+        with metrics.stage("extract") as stage:
+            archive = ZipSource(download.path, prefix="json/")
+            stage.items_out = len(archive)
+        with archive, archive.sub_source("acteur/", extension="json") as actors, \
+                archive.sub_source("organe/", extension="json") as organs:
+            manifest = Manifest.load(Environment.manifest_path(JOB_PARTITION_KEY))
+            members = archive.manifest()
+            scope = ""
+            full_load = Environment.full_load or is_empty(Actors.__table__) or is_empty(Organs.__table__)
+            if not full_load and manifest.archive_sha256 is not None:
+                changed = manifest.changed(members)
+                actors.restrict_to(changed)
+                organs.restrict_to(changed)
+                scope = f"changed-since-{manifest.archive_sha256[:16]}"
+                logging.info(f"[{JOB_PARTITION_KEY.upper()} Job] - {len(members) - len(changed)} files did not change "
+                             f"since the last archive.")
+                metrics.count("unchanged_members", len(members) - len(changed))
+            snapshot = Snapshot(Environment.snapshots(), JOB_PARTITION_KEY, download.sha256, scope)
+            tasks = [
+                Task("actors_read", partial(read_actors, actors, metrics, snapshot)),
+                Task("professions", partial(load_professions, metrics=metrics), ("actors_read",)),
+                Task("actors", partial(load_actors, metrics=metrics), ("actors_read", "professions")),
+                Task("addresses", partial(load_addresses, metrics=metrics), ("actors_read", "actors")),
+                Task("organs", partial(organs_task, organs, metrics, snapshot)),
+            ]
+
+            completed = jobs.get_checkpoint(JOB_PARTITION_KEY, download.sha256).get("completed_tasks", [])
+            # The export read by actors_read is used by the loading tasks, it is only skipped once they all completed
+            if any(t.name not in completed for t in tasks if "actors_read" in t.depends_on):
+                completed = [t for t in completed if t != "actors_read"]
+            if len(completed) > 0:
+                logging.info(f"[{JOB_PARTITION_KEY.upper()} Job] - Resuming the interrupted run, "
+                             f"{', '.join(completed)} already completed.")
+                metrics.count("resumed_tasks", len(completed))
+
+            def on_done(name: str):
+                # Stops the run before starting other tasks once the lease was lost
+                lease.ensure_held()
+                completed.append(name)
+                jobs.save_checkpoint(JOB_PARTITION_KEY, download.sha256, "tasks", completed_tasks=completed)
+
+            results = run_tasks(tasks, skip=tuple(completed), on_done=on_done)
+            # Orphan organs are stored without parent, their members are left out of the manifest so that they are
+            # read again, and linked once their parent is known. The orphans of a skipped organs task are unknown.
+            read_again = members_to_read_again(members, organs.prefix, results.get("organs"))
+
+        metrics.log()
+        jobs.update_last_run(JOB_PARTITION_KEY, metrics=metrics.as_fields(), run_datetime=now_with_tz(),
+                             source_sha256=download.sha256)
+        jobs.clear_checkpoint(JOB_PARTITION_KEY)
+        Manifest(download.sha256, {n: e for n, e in members.items() if n not in read_again}) \
+            .save(Environment.manifest_path(JOB_PARTITION_KEY))
+        logging.info("Done")
@@ -1,34 +1,98 @@
 import logging
-from typing import List, Dict
+import os
+from functools import partial
+from typing import List, Dict, Optional, Set, Tuple, Collection
 
 from sqlalchemy.orm import Session
 
-from shared.components import Database, insert_or_update, Organs
-from shared.utils import get_all_files_in_dir, wrap_around_progress_bar, read_json, get
+from shared.components import Database, Organs, existing_keys, keep_changed, depth_levels, upsert_levels, \
+    bulk_upsert, bulk_load, is_empty
+from shared.env import Environment
+from shared.utils import wrap_around_executor_progress_bar, read_json_member, get, ZipSource, PipelineMetrics, \
+    fingerprint, Snapshot
+
+SNAPSHOT_DATASET = "organs"
+
+
+def map_organ(data: Dict) -> Dict:
+    return {**Organs.export_spec.to_dict(data["organe"]), "parent_organ_uid": get(data, "organe", "organeParent")}
+
+
+def read_organs(source: ZipSource, metrics: PipelineMetrics, snapshot: Optional[Snapshot] = None) -> List[Dict]:
+    """Organs of the export mapped to rows, or read from `snapshot`."""
+    if snapshot is not None and snapshot.exists(SNAPSHOT_DATASET):
+        with metrics.stage("organs_snapshot_read") as stage:
+            new_organs = snapshot.read(SNAPSHOT_DATASET)
+            stage.items_out += len(new_organs)
+        return new_organs
+
+    logging.info(f"Found {len(source)} organs ! Applying transformations and filtering ...")
+    with source, metrics.stage("organs_read", len(source)) as stage:
+        json_data = wrap_around_executor_progress_bar(partial(read_json_member, source.path), source.names,
+                                                      "Reading JSON files", **Environment.task_parallelism())
+        stage.items_out += len(json_data)
+    with metrics.stage("organs_map", len(json_data)) as stage:
+        new_organs = list({o["uid"]: o for o in (map_organ(d) for d in json_data)}.values())
+        stage.items_out += len(new_organs)
+    if snapshot is not None:
+        with metrics.stage("organs_snapshot_write", len(new_organs)):
+            snapshot.write(SNAPSHOT_DATASET, new_organs)
+    return new_organs
 
 
 @Database.with_session
-def transform_organs(data: List[Dict], session: Session) -> List[Organs]:
+def transform_organs(data: List[Dict], metrics: PipelineMetrics, session: Session) -> Tuple[List[Dict], Set[str]]:
+    """Organs to write, the ones whose fingerprint changed, and the uids of the organs whose parent is unknown."""
     logging.info("Transforming organs ...")
-    data_dict = {get(d, "organe", "uid"): d["organe"] for d in data}
+    new_organs = {o["uid"]: o for o in data}
 
-    organs = {o.uid: o for o in session.query(Organs).all()}
-    new_organs = {uid: Organs.from_data_export(d) for uid, d in data_dict.items()}
-    for uid, d in data_dict.items():
-        if get(d, "organeParent") is not None:
-            puid = get(d, "organeParent")
-            parent = new_organs[puid] if puid in new_organs else organs[puid] if puid in organs else None
-            if parent is not None:
-                new_organs[uid].parent = parent
-    return [o for o in new_organs.values() if o.uid not in organs or o != organs[o.uid]]
+    with metrics.stage("organs_lookup", len(new_organs)) as stage:
+        outside = {o["parent_organ_uid"] for o in new_organs.values()} - new_organs.keys() - {None}
+        organs = existing_keys(session, Organs.uid, outside)
+        orphans = [o for o in new_organs.values() if o["parent_organ_uid"] in outside - organs]
+        if len(orphans) > 0:
+            logging.warning(f"{len(orphans)} organs have an unknown parent, their link is left empty: "
+                            f"{', '.join(sorted({o['parent_organ_uid'] for o in orphans})[:10])} ...")
+            metrics.count("organs_orphans", len(orphans))
+            for o in orphans:
+                # Stored with a fingerprint of its own, so the organ is loaded again once its parent is known
+                o["parent_organ_uid"] = None
+                o["fingerprint"] = fingerprint(o["fingerprint"], None)
+        changed = keep_changed(session, list(new_organs.values()), Organs.uid)
+        stage.items_out += len(changed)
+    return changed, {o["uid"] for o in orphans}
 
 
-def organs_task(data_dir: str) -> None:
-    logging.info("Integrating organs ...")
-    json_files = get_all_files_in_dir(data_dir)
-    logging.info(f"Found {len(json_files)} organs ! Applying transformations and filtering ...")
+def members_to_read_again(members: Collection[str], prefix: str, orphans: Optional[Collection[str]]) -> Set[str]:
+    """
+    Members under `prefix` holding the `orphans` organs, which have to be read again until their parent is known. All
+    of them when the orphans are unknown (None), or when a member is not named after its organ uid.
+    """
+    names = {n for n in members if n.startswith(prefix)}
+    if orphans is None:
+        return names
+    by_uid = {os.path.splitext(os.path.basename(n))[0]: n for n in names}
+    if any(u not in by_uid for u in orphans):
+        return names
+    return {by_uid[u] for u in orphans}
 
-    json_data = wrap_around_progress_bar(lambda x: read_json(x), json_files, "Reading JSON files")
-    transformed = transform_organs(json_data)
 
-    insert_or_update(transformed, Organs.uid)
+def organs_task(source: ZipSource, metrics: PipelineMetrics, snapshot: Optional[Snapshot] = None) -> Set[str]:
+    """Loads the organs of `source`, and returns the uids of the ones whose parent is unknown."""
+    logging.info("Integrating organs ...")
+    new_organs = read_organs(source, metrics, snapshot)
+    full_load = Environment.full_load or is_empty(Organs.__table__)
+    transformed, orphans = transform_organs(new_organs, metrics)
+
+    with metrics.stage("organs_write", len(transformed)) as stage:
+        levels, cyclic = depth_levels(transformed, Organs.uid.key, Organs.parent_organ_uid.key)
+        if len(cyclic) > 0:
+            logging.warning(f"{len(cyclic)} organs have a looping parent chain, loading them without parent first: "
+                            f"{', '.join(sorted(o['uid'] for o in cyclic)[:10])} ...")
+            metrics.count("organs_cycles", len(cyclic))
+            levels += [[{**o, "parent_organ_uid": None} for o in cyclic], cyclic]
+        upsert_levels(levels, Organs.__table__, write=bulk_load if full_load else bulk_upsert)
+        written = len(transformed)
+        stage.items_out += written
+    metrics.record_writes("sql", written)
+    return orphans
@@ -1,7 +1,38 @@
-from .http_utils import download_file
-from .file_utils import read_json, get_all_files_in_dir, read_jsons
-from .dict_utils import delete_keys_from_dict, delete_empty_nested_from_dict, get_or, flatten_dict, get
-from .logging_utils import wrap_around_progress_bar
-from .date_utils import TIMEZONE, now_with_tz, convert_to_datetime
-from .type_utils import to_int
-from .string_utils import decode_html_french_string
+from typing import TYPE_CHECKING
+
+from .lazy_utils import lazy_exports
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    ".http_utils": ["download_file", "DownloadResult"],
+    ".file_utils": ["read_json", "get_all_files_in_dir", "read_jsons", "read_json_bytes", "read_json_member",
+                    "decode_json"],
+    ".zip_utils": ["ZipSource", "read_zip_member"],
+    ".dict_utils": ["delete_keys_from_dict", "delete_empty_nested_from_dict", "get_or", "flatten_dict", "get"],
+    ".logging_utils": ["wrap_around_progress_bar", "wrap_around_executor_progress_bar", "ExecutorKind",
+                       "executor_pool"],
+    ".date_utils": ["TIMEZONE", "now_with_tz", "convert_to_datetime", "parse_datetime"],
+    ".type_utils": ["to_int"],
+    ".string_utils": ["decode_html_french_string"],
+    ".hash_utils": ["fingerprint"],
+    ".iter_utils": ["batched"],
+    ".metrics_utils": ["PipelineMetrics", "StageMetrics", "METRICS_PREFIX"],
+    ".scheduler_utils": ["Task", "TaskError", "run_tasks"],
+    ".snapshot_utils": ["Snapshot"],
+    ".manifest_utils": ["Manifest"],
+})
+
+if TYPE_CHECKING:
+    from .http_utils import download_file, DownloadResult
+    from .file_utils import read_json, get_all_files_in_dir, read_jsons, read_json_bytes, read_json_member, decode_json
+    from .zip_utils import ZipSource, read_zip_member
+    from .dict_utils import delete_keys_from_dict, delete_empty_nested_from_dict, get_or, flatten_dict, get
+    from .logging_utils import wrap_around_progress_bar, wrap_around_executor_progress_bar, ExecutorKind, executor_pool
+    from .date_utils import TIMEZONE, now_with_tz, convert_to_datetime, parse_datetime
+    from .type_utils import to_int
+    from .string_utils import decode_html_french_string
+    from .hash_utils import fingerprint
+    from .iter_utils import batched
+    from .metrics_utils import PipelineMetrics, StageMetrics, METRICS_PREFIX
+    from .scheduler_utils import Task, TaskError, run_tasks
+    from .snapshot_utils import Snapshot
+    from .manifest_utils import Manifest
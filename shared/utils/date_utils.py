@@ -1,4 +1,6 @@
 import datetime
+import re
+from functools import lru_cache
 from typing import Dict, Optional, Union
 
 import dateutil.tz
@@ -6,19 +8,42 @@ import dateutil.tz
 from .dict_utils import get_or
 
 TIMEZONE = dateutil.tz.gettz("Europe/Paris")
+DATE_CACHE_SIZE = 65536
+DATE_FORMAT = "%Y-%m-%d"
+DATE = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2}")
 
 
 def now_with_tz():
     return datetime.datetime.now(tz=TIMEZONE)
 
 
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_datetime(data: str) -> datetime.datetime:
+    """Parses the ISO-8601 dates of the exports with the C fast path, falling back to dateutil for odd inputs."""
+    try:
+        return datetime.datetime.fromisoformat(data)
+    except ValueError:
+        from dateutil import parser
+
+        return parser.parse(data)
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _convert_to_datetime(data: str, date_format: Optional[str], as_date: bool) -> \
+        Union[datetime.datetime | datetime.date]:
+    if date_format is None:
+        return parse_datetime(data).astimezone(tz=None)
+
+    if date_format == DATE_FORMAT and DATE.fullmatch(data):
+        result = datetime.datetime(int(data[0:4]), int(data[5:7]), int(data[8:10]))
+    else:
+        result = datetime.datetime.strptime(data, date_format)
+    return result if not as_date else datetime.date(result.year, result.month, result.day)
+
+
 def convert_to_datetime(data: Optional[str], date_format: Optional[str] = None, as_date: bool = False) -> \
         Optional[Union[datetime.datetime | datetime.date]]:
     if data is None or len(data) <= 0:
         return None
 
-    if date_format is None:
-        return datetime.datetime.fromisoformat(data).astimezone(tz=None)
-
-    result = datetime.datetime.strptime(data, date_format)
-    return result if not as_date else datetime.date(result.year, result.month, result.day)
+    return _convert_to_datetime(data, date_format, as_date)
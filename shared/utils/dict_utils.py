@@ -1,26 +1,61 @@
-from typing import Dict, List, Any, MutableMapping, Union, Optional
+from typing import Dict, List, Any, MutableMapping, Union, Optional, AbstractSet, Iterable
 
 
 def get_or(d: Dict, f: str, default: Any) -> Any:
     return d.get(f, default) or default
 
 
-def delete_keys_from_dict(dictionary: Union[Dict | List[Dict]], keys: List[str], delete_empty: bool = True):
-    def __delete_keys(d: Dict):
-        cpy = d.copy()
-        for field in cpy.keys():
-            if field in keys:
-                del d[field]
-            if type(cpy[field]) == dict:
-                __delete_keys(d[field])
-                if len(d[field]) <= 0 and delete_empty:
-                    del d[field]
-        return d
-
-    if isinstance(dictionary, List):
-        return [__delete_keys(d) for d in dictionary]
-    else:
-        return __delete_keys(dictionary)
+def _clean_in_place(value: Dict, keys: AbstractSet[str], delete_empty: bool, skip: AbstractSet[str]):
+    to_delete = None
+    for field, inner in value.items():
+        if field in keys:
+            if to_delete is None:
+                to_delete = [field]
+            else:
+                to_delete.append(field)
+            continue
+        kind = type(inner)
+        if kind is dict:
+            if field in skip:
+                continue
+            _clean_in_place(inner, keys, delete_empty, skip)
+            if delete_empty and len(inner) <= 0:
+                if to_delete is None:
+                    to_delete = [field]
+                else:
+                    to_delete.append(field)
+        elif kind is list:
+            if field in skip:
+                continue
+            _clean_list_in_place(inner, keys, delete_empty, skip)
+    if to_delete is not None:
+        for field in to_delete:
+            del value[field]
+
+
+def _clean_list_in_place(value: List, keys: AbstractSet[str], delete_empty: bool, skip: AbstractSet[str]):
+    for inner in value:
+        kind = type(inner)
+        if kind is dict:
+            _clean_in_place(inner, keys, delete_empty, skip)
+        elif kind is list:
+            _clean_list_in_place(inner, keys, delete_empty, skip)
+
+
+def delete_keys_from_dict(dictionary: Union[Dict | List[Dict]], keys: Iterable[str], delete_empty: bool = True,
+                          skip: Iterable[str] = frozenset()):
+    """
+    Removes `keys` from every nested dict in a single in-place walk, descending into lists. Nested dicts left empty
+    are removed too when `delete_empty` is set. The values of the `skip` keys are left as they are, so that subtrees
+    nobody reads are not walked. Returns the given object.
+    """
+    keys = keys if isinstance(keys, (set, frozenset)) else frozenset(keys)
+    skip = skip if isinstance(skip, (set, frozenset)) else frozenset(skip)
+    if type(dictionary) is dict:
+        _clean_in_place(dictionary, keys, delete_empty, skip)
+    elif type(dictionary) is list:
+        _clean_list_in_place(dictionary, keys, delete_empty, skip)
+    return dictionary
 
 
 def delete_empty_nested_from_dict(dictionary: Dict):
@@ -1,8 +1,11 @@
-from typing import List, Dict
+from typing import List, Dict, Optional, AbstractSet
 
 import orjson as orjson
 from pathlib import Path
 
+from .zip_utils import read_zip_member
+from .dict_utils import delete_keys_from_dict
+
 
 def read_jsons(paths: List[str]) -> List[Dict]:
     return [read_json(p) for p in paths]
@@ -13,5 +16,20 @@ def read_json(path: str) -> Dict:
         return orjson.loads(f.read())
 
 
+def read_json_bytes(data: bytes) -> Dict:
+    return orjson.loads(data)
+
+
+def decode_json(data: bytes, drop_keys: Optional[AbstractSet[str]] = None,
+                skip_keys: AbstractSet[str] = frozenset()) -> Dict:
+    decoded = orjson.loads(data)
+    return delete_keys_from_dict(decoded, drop_keys, skip=skip_keys) if drop_keys is not None else decoded
+
+
+def read_json_member(archive_path: str, name: str, drop_keys: Optional[AbstractSet[str]] = None,
+                     skip_keys: AbstractSet[str] = frozenset()) -> Dict:
+    return decode_json(read_zip_member(archive_path, name), drop_keys, skip_keys)
+
+
 def get_all_files_in_dir(path: str, extension: str = None) -> List[str]:
     return [str(p) for p in Path(path).rglob('*' + (f".{extension}" if extension is not None else "")) if p.is_file()]
@@ -0,0 +1,8 @@
+import hashlib
+from typing import Any
+
+import orjson
+
+
+def fingerprint(*values: Any) -> str:
+    return hashlib.blake2b(orjson.dumps(values, default=str, option=orjson.OPT_SORT_KEYS), digest_size=16).hexdigest()
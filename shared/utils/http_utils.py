@@ -1,33 +1,127 @@
-import io
+import hashlib
+import logging
 import os.path
 import re
 import tempfile
 import zipfile
+from dataclasses import dataclass
+from typing import Dict, Optional
 
-from requests import RequestException, get
+import orjson
+from requests import get
 
+CHUNK_SIZE = 8 * 1024 * 1024
+CACHE_FILE_PREFIX = ".download_cache-"
 
-def download_file(url: str, output_directory: str = None, auto_extract: bool = False) -> str:
+
+@dataclass
+class DownloadResult:
+    path: str
+    sha256: str
+    not_modified: bool = False
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+def _cache_path(output_directory: str, url: str) -> str:
+    # One file per URL, so that jobs downloading at the same time never write over the entries of each other
+    return os.path.join(output_directory, f"{CACHE_FILE_PREFIX}{hashlib.sha256(url.encode()).hexdigest()[:16]}.json")
+
+
+def _read_cache(output_directory: str, url: str) -> Dict:
+    try:
+        with open(_cache_path(output_directory, url), "rb") as f:
+            return orjson.loads(f.read())
+    except (FileNotFoundError, orjson.JSONDecodeError):
+        return {}
+
+
+def _update_cache(output_directory: str, url: str, **fields):
+    path = _cache_path(output_directory, url)
+    with open(path + ".tmp", "wb") as f:
+        f.write(orjson.dumps({**_read_cache(output_directory, url), **fields}))
+    os.replace(path + ".tmp", path)
+
+
+def _sha256_of(path: str) -> "hashlib._Hash":
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            sha.update(chunk)
+    return sha
+
+
+def _extract(file_path: str, not_modified: bool) -> str:
+    extract_dir = os.path.splitext(file_path)[0]
+    if not (not_modified and os.path.exists(extract_dir)):
+        zipfile.ZipFile(file_path).extractall(extract_dir)
+    return extract_dir
+
+
+def download_file(url: str, output_directory: str = None, auto_extract: bool = False) -> DownloadResult:
+    """
+    Downloads `url` into `output_directory` through a cache file per URL, which stores the ETag, Last-Modified and
+    SHA-256 of the content. Requests are conditional once the file is on disk, and interrupted transfers are resumed
+    with HTTP Range. `not_modified` is set on the result when the content did not change since the previous download.
+    """
     output_directory = output_directory or tempfile.gettempdir()
-    req = get(url, stream=True)
-    if "Content-Disposition" in req.headers.keys():
-        filename = re.findall("filename=(.+)", req.headers["Content-Disposition"])[0]
-    else:
-        filename = os.path.basename(url)
-
-    file_path = os.path.join(output_directory, filename)
-    if os.path.exists(file_path) and file_path.endswith(".zip"):
-        if os.path.exists(file_path.replace(".zip", "")):
-            return file_path.replace(".zip", "")
-
-    with open(file_path, "wb") as f:
-        for chunk in req.iter_content(chunk_size=1024):
-            if chunk:
-                f.write(chunk)
-
-    if filename.endswith("zip") and auto_extract:
-        zip_file = zipfile.ZipFile(file_path)
-        zip_file.extractall(os.path.join(output_directory, os.path.splitext(filename)[0]))
-        return os.path.join(output_directory, os.path.splitext(filename)[0])
-
-    return file_path
+    cached = _read_cache(output_directory, url)
+
+    headers = {}
+    # Empty when no download was interrupted
+    partial_path: str = cached.get("partial_path") or ""
+    resuming = len(partial_path) > 0 and os.path.exists(partial_path) and cached.get("partial_validator") is not None
+    if resuming:
+        headers["Range"] = f"bytes={os.path.getsize(partial_path)}-"
+        headers["If-Range"] = cached["partial_validator"]
+    elif "path" in cached and os.path.exists(cached["path"]):
+        if cached.get("etag") is not None:
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified") is not None:
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    with get(url, stream=True, headers=headers) as req:
+        if resuming and req.status_code == 416:
+            # The partial file already holds the whole content (or more, if it changed): start over without it
+            logging.info(f"Range {headers['Range']} of {url} cannot be satisfied, downloading it again")
+            os.remove(partial_path)
+            _update_cache(output_directory, url, partial_path=None, partial_validator=None)
+            return download_file(url, output_directory, auto_extract)
+        if req.status_code == 304:
+            logging.info(f"{url} was not modified since last download")
+            result = DownloadResult(path=cached["path"], sha256=cached["sha256"], not_modified=True,
+                                    etag=cached.get("etag"), last_modified=cached.get("last_modified"))
+        else:
+            req.raise_for_status()
+            if "Content-Disposition" in req.headers.keys():
+                filename = re.findall("filename=(.+)", req.headers["Content-Disposition"])[0].strip('"')
+            else:
+                filename = os.path.basename(url)
+            file_path = os.path.join(output_directory, filename)
+            etag, last_modified = req.headers.get("ETag"), req.headers.get("Last-Modified")
+
+            if resuming and req.status_code == 206:
+                logging.info(f"Resuming download of {filename} from {headers['Range']}")
+                sha, mode = _sha256_of(partial_path), "ab"
+            else:
+                partial_path, sha, mode = file_path + ".part", hashlib.sha256(), "wb"
+            _update_cache(output_directory, url, partial_path=partial_path, partial_validator=etag or last_modified)
+
+            with open(partial_path, mode) as f:
+                for chunk in req.iter_content(chunk_size=CHUNK_SIZE):
+                    if chunk:
+                        sha.update(chunk)
+                        f.write(chunk)
+            os.replace(partial_path, file_path)
+
+            result = DownloadResult(path=file_path, sha256=sha.hexdigest(), etag=etag, last_modified=last_modified)
+            if cached.get("sha256") == result.sha256 and cached.get("path") == result.path:
+                logging.info(f"{url} was downloaded again but its content did not change")
+                result.not_modified = True
+            _update_cache(output_directory, url, path=result.path, sha256=result.sha256, etag=etag,
+                          last_modified=last_modified, partial_path=None, partial_validator=None)
+
+    if result.path.endswith(".zip") and auto_extract:
+        result.path = _extract(result.path, result.not_modified)
+
+    return result
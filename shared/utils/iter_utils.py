@@ -0,0 +1,10 @@
+from itertools import islice
+from typing import Iterable, Iterator, List
+
+
+def batched(data: Iterable, size: int) -> Iterator[List]:
+    if size <= 0:
+        raise ValueError(f"Batch size must be positive: {size}")
+    iterator = iter(data)
+    while len(batch := list(islice(iterator, size))) > 0:
+        yield batch
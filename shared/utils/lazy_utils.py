@@ -0,0 +1,27 @@
+import importlib
+import sys
+from typing import Callable, Dict, Iterable, List, Tuple
+
+
+def lazy_exports(package: str, exports: Dict[str, Iterable[str]]) -> Tuple[Callable[[str], object], Callable[[], List]]:
+    """
+    Module level __getattr__ and __dir__ (PEP 562) for `package`, exporting names of its modules (relative module name
+    -> names) without importing them, and their dependencies, until a name is first used.
+
+    Type checkers do not see these names, so the package also imports them under `if TYPE_CHECKING:`, which is never
+    run: the real imports are only done by __getattr__.
+    """
+    modules = {name: module for module, names in exports.items() for name in names}
+    namespace = sys.modules[package].__dict__
+
+    def __getattr__(name: str) -> object:
+        if name not in modules:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(modules[name], package), name)
+        namespace[name] = value
+        return value
+
+    def __dir__() -> List:
+        return sorted(namespace.keys() | modules.keys())
+
+    return __getattr__, __dir__
@@ -1,18 +1,107 @@
 import datetime
 import logging
-from typing import Callable, List
+import multiprocessing
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Executor
+from contextlib import contextmanager
+from enum import Enum
+from typing import Callable, List, Optional, Iterator, Sequence
 
 from tqdm_loggable.auto import tqdm
 
 logging.getLogger("azure.core.pipeline.policies.http_logging_policy").setLevel(logging.WARN)
 
+POSTFIX_INTERVAL = 1.0
+
+
+class ExecutorKind(Enum):
+    THREAD = "thread"
+    PROCESS = "process"
+
+    @staticmethod
+    def from_string(value: str):
+        match value:
+            case "thread":
+                return ExecutorKind.THREAD
+            case "process":
+                return ExecutorKind.PROCESS
+            case _:
+                raise ValueError(f"Unknown executor kind: {value}")
+
+    def create(self, workers: int, preload: Sequence[str] = ()) -> Executor:
+        """
+        Process workers are started lazily, while the lease heartbeat (or any other thread) may hold a lock: they are
+        forked from a single-threaded server process rather than from the job. The server imports the `preload` modules
+        when it starts (once per process), so that the workers do not import them again.
+        """
+        if self == ExecutorKind.THREAD:
+            return ThreadPoolExecutor(max_workers=workers)
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(list(preload))
+        return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+
+def _advance(bar: tqdm, last_postfix: float) -> float:
+    bar.update(1)
+    now = time.monotonic()
+    if now - last_postfix < POSTFIX_INTERVAL:
+        return last_postfix
+    bar.set_postfix({"time": datetime.datetime.utcnow()})
+    return now
+
 
 def wrap_around_progress_bar(operation: Callable, data: List, description: str = "Progress") -> List:
     output = []
     with tqdm(total=len(data), desc=description, unit_scale=True) as bar:
+        last_postfix = 0.0
         for i in range(len(data)):
             output.append(operation(data[i]))
+            last_postfix = _advance(bar, last_postfix)
+    return output
+
 
-            bar.update(1)
-            bar.set_postfix({"time": datetime.datetime.utcnow()})
+@contextmanager
+def executor_pool(workers: Optional[int] = None, executor: ExecutorKind = ExecutorKind.PROCESS,
+                  preload: Sequence[str] = ()) -> Iterator[Optional[Executor]]:
+    """
+    Pool shared by several wrap_around_executor_progress_bar calls, None when there is a single worker. `preload` names
+    the modules of the operations run on a process pool (see ExecutorKind.create).
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        yield None
+        return
+    with executor.create(workers, preload) as pool:
+        yield pool
+
+
+def _map_with_progress_bar(pool: Executor, operation: Callable, data: List, description: str, chunk_size: int) -> List:
+    output = []
+    with tqdm(total=len(data), desc=description, unit_scale=True) as bar:
+        last_postfix = 0.0
+        for result in pool.map(operation, data, chunksize=chunk_size):
+            output.append(result)
+            last_postfix = _advance(bar, last_postfix)
     return output
+
+
+def wrap_around_executor_progress_bar(operation: Callable, data: List, description: str = "Progress",
+                                      workers: Optional[int] = None, chunk_size: int = 64,
+                                      executor: ExecutorKind = ExecutorKind.PROCESS,
+                                      pool: Optional[Executor] = None) -> List:
+    """
+    Same as wrap_around_progress_bar, but runs `operation` on a thread or process pool. Output keeps the input order.
+    With a process pool, `operation` and the data must be picklable (module level functions, no lambdas).
+    An already started `pool` (see executor_pool) is reused instead of creating one per call.
+    """
+    if pool is not None:
+        return _map_with_progress_bar(pool, operation, data, description, chunk_size) if len(data) > chunk_size \
+            else wrap_around_progress_bar(operation, data, description)
+
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(data) <= chunk_size:
+        return wrap_around_progress_bar(operation, data, description)
+
+    with executor.create(workers) as created:
+        return _map_with_progress_bar(created, operation, data, description, chunk_size)
@@ -0,0 +1,33 @@
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Set, Tuple
+
+import orjson
+
+
+@dataclass
+class Manifest:
+    """
+    Size and CRC-32 of the members of the last archive a job processed successfully, saved as JSON, so that the next
+    run only reads the members which were added or changed since.
+    """
+    archive_sha256: Optional[str] = None
+    members: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: str) -> "Manifest":
+        try:
+            with open(path, "rb") as f:
+                data = orjson.loads(f.read())
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            return cls()
+        return cls(data.get("archive_sha256"), {k: tuple(v) for k, v in data.get("members", {}).items()})
+
+    def changed(self, members: Dict[str, Tuple[int, int]]) -> Set[str]:
+        return {name for name, entry in members.items() if self.members.get(name) != entry}
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            f.write(orjson.dumps({"archive_sha256": self.archive_sha256, "members": self.members}))
+        os.replace(path + ".tmp", path)
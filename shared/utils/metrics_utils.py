@@ -0,0 +1,101 @@
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from types import ModuleType
+from typing import Dict, Iterator, Optional
+
+resource: Optional[ModuleType]
+try:
+    import resource
+except ImportError:
+    resource = None
+
+METRICS_PREFIX = "metrics_"
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+@dataclass
+class StageMetrics:
+    name: str
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    items_in: int = 0
+    items_out: int = 0
+    peak_rss_mb: Optional[float] = None
+
+    @property
+    def throughput(self) -> float:
+        return self.items_in / self.wall_time if self.wall_time > 0 else 0.0
+
+    def as_fields(self) -> Dict:
+        fields = {
+            "wall_time_s": round(self.wall_time, 3),
+            "cpu_time_s": round(self.cpu_time, 3),
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+            "throughput": round(self.throughput, 1)
+        }
+        if self.peak_rss_mb is not None:
+            fields["peak_rss_mb"] = round(self.peak_rss_mb, 1)
+        return {f"{METRICS_PREFIX}{self.name}_{k}": v for k, v in fields.items()}
+
+
+class PipelineMetrics:
+    """
+    Wall time, CPU time (of the thread running the stage, not of the pool workers), item counts and peak RSS per
+    stage, plus write counters. Stages entered several times (one per batch) are accumulated. Stages may run from
+    several threads, as long as each stage name is used by one thread at a time.
+    """
+    stages: Dict[str, StageMetrics]
+    counters: Dict[str, int]
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str, items_in: int = 0) -> Iterator[StageMetrics]:
+        with self._lock:
+            metrics = self.stages.setdefault(name, StageMetrics(name))
+        metrics.items_in += items_in
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield metrics
+        finally:
+            metrics.wall_time += time.perf_counter() - wall
+            metrics.cpu_time += time.thread_time() - cpu
+            metrics.peak_rss_mb = peak_rss_mb()
+
+    def count(self, name: str, value: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def record_writes(self, target: str, succeeded: int, failed: int = 0):
+        self.count(f"{target}_written", succeeded)
+        if failed > 0:
+            self.count(f"{target}_failed", failed)
+
+    def as_fields(self) -> Dict:
+        fields = {}
+        for stage in list(self.stages.values()):
+            fields.update(stage.as_fields())
+        fields.update({f"{METRICS_PREFIX}{k}": v for k, v in self.counters.items()})
+        return fields
+
+    def log(self):
+        for s in self.stages.values():
+            logging.info(f"Stage {s.name}: {s.wall_time:.2f}s wall, {s.cpu_time:.2f}s CPU, {s.items_in} in, "
+                         f"{s.items_out} out ({s.throughput:.0f}/s), peak RSS {s.peak_rss_mb} MB")
+        for name, value in self.counters.items():
+            logging.info(f"{name}: {value}")
@@ -0,0 +1,106 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from typing import Callable, Any, Tuple, List, Dict, Optional, Set, Collection
+
+
+@dataclass(frozen=True)
+class Task:
+    """
+    A job sub-task. `operation` is called with the results of `depends_on`, in that order, once they all succeeded.
+    """
+    name: str
+    operation: Callable[..., Any]
+    depends_on: Tuple[str, ...] = ()
+
+
+class TaskError(Exception):
+    def __init__(self, task: str, cancelled: List[str]):
+        super().__init__(f"Task {task} failed" + (f", cancelled {', '.join(cancelled)}" if len(cancelled) > 0 else ""))
+        self.task = task
+        self.cancelled = cancelled
+
+
+def _check(tasks: List[Task]) -> Dict[str, Task]:
+    by_name = {t.name: t for t in tasks}
+    if len(by_name) != len(tasks):
+        raise ValueError("Task names must be unique")
+    for t in tasks:
+        unknown = [d for d in t.depends_on if d not in by_name]
+        if len(unknown) > 0:
+            raise ValueError(f"Task {t.name} depends on unknown tasks: {', '.join(unknown)}")
+
+    visited: Set[str] = set()
+
+    def visit(name: str, path: Tuple[str, ...]):
+        if name in path:
+            raise ValueError(f"Tasks have a dependency cycle: {' -> '.join(path + (name,))}")
+        if name not in visited:
+            for d in by_name[name].depends_on:
+                visit(d, path + (name,))
+            visited.add(name)
+
+    for t in tasks:
+        visit(t.name, ())
+    return by_name
+
+
+def _dependents(tasks: Dict[str, Task], failed: str) -> List[str]:
+    found = []
+    for t in tasks.values():
+        if failed in t.depends_on and t.name not in found:
+            found += [t.name] + [d for d in _dependents(tasks, t.name) if d not in found]
+    return found
+
+
+def run_tasks(tasks: List[Task], max_workers: Optional[int] = None, skip: Collection[str] = (),
+              on_done: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    Runs `tasks` on a thread pool, each as soon as its dependencies succeeded, and returns their results by name.
+    When a task fails, the tasks depending on it are cancelled, the independent ones run to completion, then a
+    TaskError chained to the first failure is raised.
+    Tasks in `skip` (completed by a previous run) are not run and their result is None, so only tasks whose result is
+    not used by their dependents should be skipped. `on_done` is called, from the calling thread, with the name of
+    each task that succeeded. When it raises, no other task is started and its exception is raised once the running
+    tasks are done.
+    """
+    by_name = _check(tasks)
+    results: Dict[str, Any] = {name: None for name in skip if name in by_name}
+    for name in results:
+        logging.info(f"Skipping task {name}, completed by a previous run")
+    cancelled: List[str] = []
+    failures: List[Tuple[str, BaseException]] = []
+    pending = {name: t for name, t in by_name.items() if name not in results}
+    running: Dict[Future, str] = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(tasks) or 1, thread_name_prefix="task") as pool:
+        while len(pending) > 0 or len(running) > 0:
+            for name, t in list(pending.items()):
+                if all(d in results for d in t.depends_on):
+                    del pending[name]
+                    logging.info(f"Starting task {name}")
+                    running[pool.submit(t.operation, *[results[d] for d in t.depends_on])] = name
+            if len(running) <= 0:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                error = future.exception()
+                if error is None:
+                    logging.info(f"Task {name} done")
+                    results[name] = future.result()
+                    if on_done is not None:
+                        on_done(name)
+                    continue
+                logging.error(f"Task {name} failed: {error!r}")
+                failures.append((name, error))
+                for dependent in _dependents(by_name, name):
+                    if pending.pop(dependent, None) is not None:
+                        logging.warning(f"Cancelling task {dependent}, as it depends on {name}")
+                        cancelled.append(dependent)
+
+    if len(failures) > 0:
+        name, exception = failures[0]
+        raise TaskError(name, cancelled) from exception
+    return results
@@ -0,0 +1,60 @@
+import logging
+import os
+import shutil
+from typing import Collection, Dict, List, Optional, Tuple
+
+import pyarrow
+import pyarrow.parquet as pq
+
+SNAPSHOT_RETENTION = 2
+
+
+class Snapshot:
+    """
+    Parquet files of the mapped datasets of a job, under `directory`/`job`/`archive_sha256`/`scope`, so that a run on
+    the same archive (a retry, or analysts) reads the rows instead of decoding the JSON export again. Datasets may be
+    nested, like "amendments/part-1". Only the snapshots of the `SNAPSHOT_RETENTION` last archives of the job are kept.
+    """
+    path: str
+
+    def __init__(self, directory: str, job: str, archive_sha256: str, scope: str = ""):
+        self._job_directory = os.path.join(directory, job)
+        self._archive_directory = os.path.join(self._job_directory, archive_sha256)
+        self.path = os.path.join(self._archive_directory, scope)
+
+    def _file(self, dataset: str) -> str:
+        return os.path.join(self.path, f"{dataset}.parquet")
+
+    def exists(self, dataset: str) -> bool:
+        return os.path.exists(self._file(dataset))
+
+    def write(self, dataset: str, rows: List[Dict]):
+        path = self._file(dataset)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written aside then renamed, so that an interrupted write does not leave a truncated snapshot behind
+        pq.write_table(pyarrow.Table.from_pylist(rows), path + ".tmp")
+        os.replace(path + ".tmp", path)
+        os.utime(self._archive_directory)
+        self._prune()
+
+    def read(self, dataset: str, columns: Optional[List[str]] = None,
+             where_in: Optional[Tuple[str, Collection]] = None) -> List[Dict]:
+        """
+        Rows of `dataset`, restricted to `columns` when given, and to the rows whose `where_in[0]` column holds one of
+        the `where_in[1]` values. Only the requested columns are decoded.
+        """
+        path = self._file(dataset)
+        if pq.ParquetFile(path).metadata.num_rows <= 0:
+            return []
+        if where_in is not None and len(where_in[1]) <= 0:
+            return []
+        filters = [(where_in[0], "in", list(where_in[1]))] if where_in is not None else None
+        return pq.read_table(path, columns=columns, filters=filters).to_pylist()
+
+    def _prune(self):
+        archives = sorted((os.path.join(self._job_directory, a) for a in os.listdir(self._job_directory)),
+                          key=os.path.getmtime, reverse=True)
+        for archive in archives[SNAPSHOT_RETENTION:]:
+            if archive != self._archive_directory:
+                logging.info(f"Removing the snapshot {archive}")
+                shutil.rmtree(archive, ignore_errors=True)
@@ -1,6 +1,65 @@
 import html
-from bs4 import BeautifulSoup
+import re
+from functools import lru_cache
+from typing import Optional
+
+DECODE_CACHE_SIZE = 8192
+ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+# Tags whose text BeautifulSoup returns as-is: no string container (script, style, template, rt, rp), no preserved
+# whitespace (pre, textarea) and no raw text content. Anything else goes through BeautifulSoup.
+SIMPLE_TAGS = {
+    "a", "abbr", "b", "big", "blockquote", "br", "caption", "center", "cite", "col", "colgroup", "dd", "div", "dl",
+    "dt", "em", "font", "h1", "h2", "h3", "h4", "h5", "h6", "hr", "i", "img", "li", "ol", "p", "q", "s", "small",
+    "span", "strike", "strong", "sub", "sup", "table", "tbody", "td", "tfoot", "th", "thead", "tr", "u", "ul"
+}
+TAG = re.compile(r"<(/?)([a-zA-Z][a-zA-Z0-9]*)([^<>]*)>")
+ATTRIBUTES = re.compile(r"(?:[ \t\n\r\f]+[^ \t\n\r\f\"'<>/=]+(?:[ \t\n\r\f]*=[ \t\n\r\f]*"
+                        r"(?:\"[^\"<>]*\"|'[^'<>]*'|[^ \t\n\r\f\"'=<>`]+))?)*[ \t\n\r\f]*/?")
+REFERENCE = re.compile(r"&(?:[#a-zA-Z]|$)")
+
+
+def _text_node(data: str) -> str:
+    # BeautifulSoup collapses whitespace-only strings to a single newline or space
+    if len(data) > 0 and len(data.strip(ASCII_SPACES)) == 0:
+        return "\n" if "\n" in data else " "
+    return data
+
+
+def _strip_simple_markup(string: str) -> Optional[str]:
+    """Streaming tag stripper, returning None when the markup is not simple enough to match BeautifulSoup."""
+    if "&" in string and REFERENCE.search(string) is not None:
+        return None
+    parts = []
+    position = 0
+    for tag in TAG.finditer(string):
+        text = string[position:tag.start()]
+        if "<" in text or tag.group(2).lower() not in SIMPLE_TAGS:
+            return None
+        if len(tag.group(3)) > 0 and ATTRIBUTES.fullmatch(tag.group(3)) is None:
+            return None
+        parts.append(_text_node(text))
+        position = tag.end()
+    text = string[position:]
+    if "<" in text:
+        return None
+    parts.append(_text_node(text))
+    return "".join(parts)
+
+
+def _beautiful_soup_text(string: str) -> str:
+    from bs4 import BeautifulSoup
+
+    return BeautifulSoup(string, features="html.parser").get_text()
+
+
+@lru_cache(maxsize=DECODE_CACHE_SIZE)
+def _decode_markup(string: str) -> str:
+    unescaped = html.unescape(string).replace("\xa0", u" ")
+    text = _strip_simple_markup(unescaped)
+    return text if text is not None else _beautiful_soup_text(unescaped)
 
 
 def decode_html_french_string(string: str) -> str:
-    return BeautifulSoup(html.unescape(string).replace("\xa0", u" "), features="html.parser").get_text()
+    if "<" not in string and "&" not in string:
+        return _text_node(string.replace("\xa0", u" "))
+    return _decode_markup(string)
@@ -0,0 +1,113 @@
+import mmap
+import os
+import threading
+import zipfile
+from typing import Iterator, List, Optional, Tuple, Dict, Collection
+
+
+class _MappedFile:
+    """Minimal seekable file-like view over a read-only mmap, as expected by zipfile."""
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read(self, size: int = -1) -> bytes:
+        return self._map.read(size if size is not None and size >= 0 else None)
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            self._map.seek(offset, os.SEEK_CUR)
+        elif whence == os.SEEK_END:
+            self._map.seek(offset, os.SEEK_END)
+        else:
+            self._map.seek(offset, os.SEEK_SET)
+        return self._map.tell()
+
+    def tell(self) -> int:
+        return self._map.tell()
+
+    def seekable(self) -> bool:
+        return True
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+class ZipSource:
+    """
+    Reads members of a zip archive lazily, without extracting anything on disk.
+    Iterating over it yields (member_name, bytes) tuples, restricted to the members under `prefix`.
+    """
+    _zip: zipfile.ZipFile
+    _mapped: Optional[_MappedFile]
+    names: List[str]
+
+    def __init__(self, path: str, prefix: str = "", extension: Optional[str] = None, use_mmap: bool = True):
+        self.path = path
+        self.prefix = prefix
+        self._mapped = _MappedFile(path) if use_mmap else None
+        self._zip = zipfile.ZipFile(self._mapped if self._mapped is not None else path)
+        suffix = f".{extension}" if extension is not None else ""
+        self.names = [i.filename for i in self._zip.infolist()
+                      if not i.is_dir() and i.filename.startswith(prefix) and i.filename.endswith(suffix)]
+
+    def sub_source(self, prefix: str, extension: Optional[str] = None) -> "ZipSource":
+        return ZipSource(self.path, prefix=self.prefix + prefix, extension=extension, use_mmap=self._mapped is not None)
+
+    def read(self, name: str) -> bytes:
+        return self._zip.read(name)
+
+    def manifest(self) -> Dict[str, Tuple[int, int]]:
+        """Size and CRC-32 of each member, as recorded in the central directory (nothing is decompressed)."""
+        return {name: (info.file_size, info.CRC) for name, info in ((n, self._zip.getinfo(n)) for n in self.names)}
+
+    def restrict_to(self, names: Collection[str]) -> "ZipSource":
+        self.names = [n for n in self.names if n in names]
+        return self
+
+    def __iter__(self) -> Iterator[Tuple[str, bytes]]:
+        for name in self.names:
+            yield name, self.read(name)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def close(self):
+        self._zip.close()
+        if self._mapped is not None:
+            self._mapped.close()
+
+    def __enter__(self) -> "ZipSource":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+_shared_sources: Dict[str, Tuple[Tuple[int, int], ZipSource]] = {}
+_shared_sources_lock = threading.Lock()
+
+
+def _shared_source(path: str, modified: int, size: int) -> ZipSource:
+    """The source kept open on `path`, replaced (and closed) once the archive there changed."""
+    with _shared_sources_lock:
+        cached = _shared_sources.get(path)
+        if cached is not None and cached[0] == (modified, size):
+            return cached[1]
+        source = ZipSource(path)
+        _shared_sources[path] = ((modified, size), source)
+    if cached is not None:
+        cached[1].close()
+    return source
+
+
+def read_zip_member(path: str, name: str) -> bytes:
+    """
+    Reads a member through a source kept open for the current process, so that it can be used from pool workers.
+    Sources are keyed by modification time and size too, so an archive downloaded again to the same path is reopened
+    and the mapping of the previous one is closed.
+    """
+    stat = os.stat(path)
+    return _shared_source(path, stat.st_mtime_ns, stat.st_size).read(name)
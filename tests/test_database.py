@@ -0,0 +1,56 @@
+import pytest
+from sqlalchemy import select, func, text, inspect, Table, MetaData, Column, String
+
+from shared.components import Database, Professions, existing_keys, insert_or_update, ensure_columns
+from shared.components.models import Base
+
+
+@pytest.fixture
+def database(tmp_path):
+    Database.init_with_credentials("sqlite", "", "", "", 0, str(tmp_path / "database.db"))
+    with Database.get_session() as session:
+        Base.metadata.create_all(session.get_bind())
+    return Database
+
+
+def load_professions(names):
+    with Database.get_session() as session:
+        existing = existing_keys(session, Professions.name, names)
+    insert_or_update([Professions(name=n) for n in set(names) if n not in existing], Professions.name)
+
+
+def test_existing_keys_looks_up_null_keys(database):
+    with database.get_session() as session:
+        assert existing_keys(session, Professions.name, [None, "avocat"]) == set()
+        session.add_all([Professions(name=None), Professions(name="avocat")])
+        session.flush()
+        assert existing_keys(session, Professions.name, [None, "avocat", "médecin"]) == {None, "avocat"}
+        assert existing_keys(session, Professions.name, ["avocat"]) == {"avocat"}
+
+
+def test_existing_keys_looks_up_null_keys_with_temp_table(database):
+    with database.get_session() as session:
+        session.add_all([Professions(name=None), Professions(name="avocat")])
+        session.flush()
+        assert existing_keys(session, Professions.name, [None, "avocat", "médecin"], temp_table_threshold=1) == \
+            {None, "avocat"}
+
+
+def test_profession_without_name_is_inserted_once(database):
+    for _ in range(3):
+        load_professions([None, "avocat"])
+    with database.get_session() as session:
+        assert session.execute(select(func.count()).select_from(Professions).where(Professions.name.is_(None))) \
+            .scalar_one() == 1
+        assert session.execute(select(func.count()).select_from(Professions)).scalar_one() == 2
+
+
+def test_ensure_columns_adds_missing_fingerprint_once(database):
+    with database.get_session() as session:
+        session.execute(text("CREATE TABLE legacy (uid VARCHAR PRIMARY KEY)"))
+        session.commit()
+    legacy = Table("legacy", MetaData(), Column("uid", String, primary_key=True), Column("fingerprint", String(32)))
+    for _ in range(2):
+        ensure_columns([legacy.c.fingerprint, legacy.c.uid])
+    with database.get_session() as session:
+        assert [c["name"] for c in inspect(session.connection()).get_columns("legacy")] == ["uid", "fingerprint"]
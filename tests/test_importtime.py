@@ -0,0 +1,15 @@
+from pathlib import Path
+
+from benchmarks.importtime import import_times
+
+BUDGET_MS = 400
+
+
+def test_function_app_imports_within_budget(monkeypatch):
+    # function_app is imported from the root of the repository
+    monkeypatch.chdir(Path(__file__).parent.parent)
+    # The first run compiles the changed modules, then the best of a few runs, a single one is noisy on a loaded machine
+    import_times("function_app")
+    total, _, loaded = min((import_times("function_app") for _ in range(5)), key=lambda r: r[0])
+    assert loaded == [], f"imported at startup instead of on first run: {loaded}"
+    assert total / 1000 <= BUDGET_MS
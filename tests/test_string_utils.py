@@ -0,0 +1,9 @@
+from benchmarks.decode_html import reference, synthetic_samples, realistic_samples
+from shared.utils import decode_html_french_string
+
+
+def test_decode_html_french_string_matches_beautifulsoup():
+    samples = synthetic_samples(5000) + realistic_samples(2000)
+    mismatches = [(s, reference(s), decode_html_french_string(s)) for s in samples
+                  if decode_html_french_string(s) != reference(s)]
+    assert mismatches[:10] == []